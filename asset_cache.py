@@ -0,0 +1,208 @@
+import pygame as pg
+import json
+import mmap
+import os
+import struct
+from settings import *
+
+CACHE_MAGIC = b'RCAC'
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct('<4sII')
+
+
+class AssetCache:
+    def __init__(self, path=ASSET_CACHE_PATH):
+        self.path = path
+        self.images = {}
+        self.frame_names = {}
+        self.surfaces = {}
+        self.buffer = None
+        self.data_offset = 0
+        self.baking = None
+
+    def prepare(self):
+        if self.buffer is None and not self.load():
+            self.bake()
+            self.load()
+
+    def load(self):
+        # обрезанный или битый файл считается устаревшим: prepare пересоберёт кэш, а не упадёт
+        if not os.path.isfile(self.path) or not os.path.getsize(self.path):
+            return False
+        with open(self.path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            index, data_offset = self.read_index(buffer)
+        except (struct.error, ValueError, KeyError, TypeError):
+            index = None
+        if index is None or index['settings'] != self.get_settings() or self.is_stale(index['sources']):
+            buffer.close()
+            return False
+        self.images, self.frame_names = index['images'], index['frames']
+        self.buffer, self.data_offset = buffer, data_offset
+        return True
+
+    @staticmethod
+    def read_index(buffer):
+        magic, version, index_size = CACHE_HEADER.unpack_from(buffer)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            return None, 0
+        data_offset = CACHE_HEADER.size + index_size
+        index = json.loads(buffer[CACHE_HEADER.size:data_offset])
+        # все картинки индекса должны целиком лежать в файле
+        end = max((offset + width * height * len(fmt) for offset, width, height, fmt in index['images'].values()),
+                  default=0)
+        if data_offset + end > len(buffer):
+            return None, 0
+        return index, data_offset
+
+    def bake(self):
+        self.close()
+        self.baking = {'images': {}, 'frames': {}, 'sources': {}}
+        try:
+            self.bake_manifest()
+            baked = self.baking
+        finally:
+            self.baking = None
+
+        images, blobs, offset = {}, [], 0
+        for key, (surface, fmt) in baked['images'].items():
+            data = pg.image.tobytes(surface, fmt)
+            images[key] = [offset, *surface.get_size(), fmt]
+            blobs.append(data)
+            offset += len(data)
+        index = json.dumps({'settings': self.get_settings(), 'sources': baked['sources'],
+                            'images': images, 'frames': baked['frames']}).encode()
+
+        with open(self.path + '.tmp', 'wb') as file:
+            file.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(index)))
+            file.write(index)
+            for data in blobs:
+                file.write(data)
+        os.replace(self.path + '.tmp', self.path)
+
+    def bake_manifest(self):
+        self.texture('resources/textures/sky.png', RES, alpha=False)
+        self.texture('resources/textures/sky.png', (WIDTH, HALF_HEIGHT))
+        self.texture('resources/textures/win.png', RES)
+        for i in range(11):
+            self.texture(f'resources/textures/digits/{i}.png', (DIGIT_SIZE, DIGIT_SIZE))
+        for texture in WALL_TEXTURES:
+            self.mips(f'resources/textures/{texture}.png')
+        for sprite_dir in ('static_sprites', 'animated_sprites', 'npc'):
+            for path, dir_names, file_names in os.walk('resources/sprites/' + sprite_dir):
+                if any(file_name.endswith('.png') for file_name in file_names):
+                    self.frames(path.replace(os.sep, '/'))
+        self.frames('resources/sprites/weapon/shotgun', WEAPON_SCALE)
+
+    def close(self):
+        self.surfaces = {}
+        if self.buffer is not None:
+            self.images, self.frame_names = {}, {}
+            self.buffer.close()
+            self.buffer = None
+
+    @staticmethod
+    def get_settings():
+        return [list(RES), TEXTURE_SIZE, WALL_MIP_LEVELS, DIGIT_SIZE, WEAPON_SCALE,
+                list(SPRITE_COLORKEY), list(SPRITE_COLORKEY_SUBSTITUTE), ALPHA_THRESHOLD]
+
+    @staticmethod
+    def is_stale(sources):
+        for path, (mtime, size) in sources.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return True
+            if stat.st_mtime_ns != mtime or (size is not None and stat.st_size != size):
+                return True
+        return False
+
+    def add_source(self, path, is_dir=False):
+        if self.baking is not None:
+            stat = os.stat(path)
+            self.baking['sources'][path] = [stat.st_mtime_ns, None if is_dir else stat.st_size]
+
+    def get_image(self, key, alpha):
+        # convert() делает копию в формате экрана; копия одна на процесс и общая для всех
+        # экземпляров игры, поэтому поверхности из кэша только читаются
+        if (key, alpha) in self.surfaces:
+            return self.surfaces[key, alpha]
+        if key in self.images:
+            offset, width, height, fmt = self.images[key]
+            start = self.data_offset + offset
+            data = memoryview(self.buffer)[start:start + width * height * len(fmt)]
+            image = pg.image.frombuffer(data, (width, height), fmt)
+            image = image.convert_alpha() if alpha else image.convert()
+            self.surfaces[key, alpha] = image
+            return image
+
+    def put_image(self, key, image, alpha):
+        if self.baking is not None:
+            self.baking['images'][key] = (image, 'RGBA' if alpha else 'RGB')
+        return image
+
+    def load_png(self, path, alpha):
+        self.add_source(path)
+        image = pg.image.load(path)
+        return image.convert_alpha() if alpha else image.convert()
+
+    def texture(self, path, res=(TEXTURE_SIZE, TEXTURE_SIZE), alpha=True):
+        key = f'texture:{path}:{res[0]}x{res[1]}:{int(alpha)}'
+        image = self.get_image(key, alpha)
+        if image is None:
+            image = pg.transform.scale(self.load_png(path, alpha), res)
+            image = self.put_image(key, image, alpha)
+        return image
+
+    def mips(self, path, levels=WALL_MIP_LEVELS):
+        mips = [self.texture(path, alpha=False)]
+        for level in range(1, levels):
+            key = f'mip:{path}:{level}'
+            image = self.get_image(key, False)
+            if image is None:
+                size = TEXTURE_SIZE >> level
+                image = self.put_image(key, pg.transform.smoothscale(mips[-1], (size, size)), False)
+            mips.append(image)
+        return mips
+
+    def frames(self, path, scale=1):
+        key = f'frames:{path}:{scale}'
+        if key in self.frame_names:
+            return {f'{path}/{name}': self.get_image(f'{key}:{name}', False)
+                    for name in self.frame_names[key]}
+
+        self.add_source(path, is_dir=True)
+        names = sorted((name for name in os.listdir(path) if name.endswith('.png')), key=self.frame_order)
+        images = {}
+        for name in names:
+            image = self.load_png(f'{path}/{name}', True)
+            if scale != 1:
+                image = pg.transform.smoothscale(image, (image.get_width() * scale, image.get_height() * scale))
+            images[f'{path}/{name}'] = self.put_image(f'{key}:{name}', to_colorkey(image), False)
+        if self.baking is not None:
+            self.baking['frames'][key] = names
+        return images
+
+    @staticmethod
+    def frame_order(file_name):
+        name = file_name.rsplit('.', 1)[0]
+        return (0, int(name), '') if name.isdigit() else (1, 0, name)
+
+
+def to_colorkey(image):
+    # полупрозрачные пиксели заменяются цветовым ключом, чтобы блиты шли без альфа-смешивания
+    pixels = pg.surfarray.array3d(image)
+    transparent = pg.surfarray.array_alpha(image) < ALPHA_THRESHOLD
+    pixels[(pixels == SPRITE_COLORKEY).all(axis=2) & ~transparent] = SPRITE_COLORKEY_SUBSTITUTE
+    pixels[transparent] = SPRITE_COLORKEY
+    return pg.surfarray.make_surface(pixels).convert()
+
+
+assets = AssetCache()
+
+if __name__ == '__main__':
+    pg.init()
+    pg.display.set_mode((1, 1), pg.HIDDEN)
+    assets.bake()
+    print(f'{ASSET_CACHE_PATH}: {os.path.getsize(ASSET_CACHE_PATH) / 2 ** 20:.1f} MB')
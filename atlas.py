@@ -0,0 +1,103 @@
+import pygame as pg
+import threading
+from functools import cached_property, lru_cache
+from queue import Queue
+from settings import *
+from asset_cache import *
+
+
+class TextureAtlas:
+    def __init__(self, images, colorkey=None, rle=False):
+        self.colorkey = colorkey
+        self.rle = rle and colorkey is not None
+        self.rects = {}
+        width = sum(image.get_width() for image in images.values())
+        height = max(image.get_height() for image in images.values())
+
+        self.surface = pg.Surface((width, height)).convert()
+        if colorkey is not None:
+            self.surface.fill(colorkey)
+            self.surface.set_colorkey(colorkey, pg.RLEACCEL if self.rle else 0)
+        x = 0
+        for key, image in images.items():
+            self.rects[key] = self.surface.blit(image, (x, 0))
+            x += image.get_width()
+
+    @classmethod
+    def from_alpha(cls, images, rle=False):
+        return cls({key: to_colorkey(image) for key, image in images.items()}, SPRITE_COLORKEY, rle)
+
+    def get(self, key):
+        return self.surface.subsurface(self.rects[key])
+
+    def get_rle(self, key):
+        # подповерхность не наследует RLE атласа, поэтому кадр, который рисуется без масштаба,
+        # хранится отдельной поверхностью со своим RLE-кодированием
+        image = self.get(key).copy()
+        image.set_colorkey(self.colorkey, pg.RLEACCEL)
+        return image
+
+    @cached_property
+    def frames(self):
+        # кадры общие для всех спрайтов атласа, каждый хранит только свою очередь ссылок
+        return [self.get_rle(key) if self.rle else self.get(key) for key in self.rects]
+
+
+@lru_cache
+def get_sprite_atlas(path, scale=1, rle=False):
+    return TextureAtlas(assets.frames(path, scale), SPRITE_COLORKEY, rle)
+
+
+@lru_cache
+def get_wall_atlases():
+    # атласы стен по уровням mip-карт строятся один раз на процесс и общие для всех экземпляров игры
+    mips = {texture: assets.mips(f'resources/textures/{texture}.png') for texture in WALL_TEXTURES}
+    return tuple(TextureAtlas({texture: mips[texture][level] for texture in mips}) for level in range(WALL_MIP_LEVELS))
+
+
+def get_sprite_frames(path):
+    return get_sprite_atlas(path).frames
+
+
+def get_sprite_image(path):
+    return get_sprite_atlas(path.rsplit('/', 1)[0]).get(path)
+
+
+class AnimationLibrary:
+    def __init__(self):
+        self.atlases = {}
+        self.lock = threading.Lock()
+        self.queue = Queue()
+        self.pending = set()
+        self.worker = None
+
+    def get(self, path):
+        atlas = self.atlases.get(path)
+        if atlas is None:
+            with self.lock:
+                atlas = self.atlases.get(path)
+                if atlas is None:
+                    atlas = self.atlases[path] = TextureAtlas(assets.frames(path), SPRITE_COLORKEY)
+        return atlas
+
+    def preload(self, paths):
+        for path in paths:
+            if path not in self.atlases and path not in self.pending:
+                self.pending.add(path)
+                self.queue.put(path)
+        if self.pending and self.worker is None:
+            self.worker = threading.Thread(target=self.load_pending, daemon=True)
+            self.worker.start()
+
+    def load_pending(self):
+        while True:
+            path = self.queue.get()
+            self.get(path)
+            self.pending.discard(path)
+
+    def evict(self, keep):
+        for path in self.atlases.keys() - set(keep) - self.pending:
+            del self.atlases[path]
+
+
+animations = AnimationLibrary()
@@ -0,0 +1,107 @@
+import os
+import argparse
+import time
+import tracemalloc
+import types
+from functools import lru_cache
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+from main import *
+
+
+def get_positions(game, count, seed=0):
+    ys, xs = np.nonzero(game.map.grid == 0)
+    cells = np.random.default_rng(seed).integers(0, len(xs), size=count)
+    return list(zip((xs[cells] + 0.5).tolist(), (ys[cells] + 0.5).tolist()))
+
+
+@lru_cache
+def get_dict_class(cls):
+    # та же иерархия классов без __slots__: атрибуты экземпляров лежат в __dict__, как до слотов;
+    # методам с super() подставляется своя ячейка __class__, указывающая на новый класс
+    if cls is object:
+        return object
+    slots = vars(cls).get('__slots__', ())
+    slots = (slots,) if isinstance(slots, str) else slots
+    namespace = {key: value for key, value in vars(cls).items()
+                 if key not in ('__slots__', '__dict__', '__weakref__', *slots)}
+    dict_cls = type(cls.__name__, tuple(get_dict_class(base) for base in cls.__bases__), namespace)
+    for key, value in namespace.items():
+        if isinstance(value, types.FunctionType) and '__class__' in value.__code__.co_freevars:
+            closure = tuple(types.CellType(dict_cls) if name == '__class__' else cell
+                            for name, cell in zip(value.__code__.co_freevars, value.__closure__))
+            setattr(dict_cls, key, types.FunctionType(value.__code__, value.__globals__, key,
+                                                      value.__defaults__, closure))
+    return dict_cls
+
+
+def measure_memory(game, count, npc_type=SoldierNPC):
+    # прирост памяти на одного NPC вместе с его строкой в EntityStore
+    positions = get_positions(game, count)
+    npc_type(game, pos=positions[0])
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    npcs = [npc_type(game, pos=pos) for pos in positions]
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return npcs, used / count
+
+
+def measure_update(game, npcs, frames, repeat=5):
+    # логика NPC без отрисовки: таймер анимации, луч до игрока и столкновения со стенами;
+    # берётся лучший из нескольких прогонов, чтобы убрать шум планировщика
+    game.entities.project(game.player)
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for frame in range(frames):
+            step = 0.01 if frame % 2 else -0.01
+            for npc in npcs:
+                npc.check_animation_time()
+                npc.ray_cast_value = npc.ray_cast_player_npc()
+                npc.check_wall_collision(step, step)
+        best = min(best, time.perf_counter() - start)
+    return best / (frames * len(npcs))
+
+
+def measure_replay(path, level_path=None):
+    # запись прогоняется без ограничения FPS; время кадра - симуляция тика и отрисовка
+    game = Game(level_path, controls=Replay.load(path))
+    game.game_active = True
+    frame_times = []
+    while not game.controls.finished:
+        pg.event.pump()
+        start = time.perf_counter()
+        game.update()
+        game.draw()
+        frame_times.append(time.perf_counter() - start)
+    return np.array(frame_times) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Микробенчмарк обновления NPC')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--replay', help='прогнать запись ввода и вывести распределение времени кадра')
+    parser.add_argument('--level')
+    args = parser.parse_args()
+
+    if args.replay:
+        frame_times = measure_replay(args.replay, args.level)
+        p50, p95, p99 = np.percentile(frame_times, (50, 95, 99))
+        print(f'{len(frame_times)} frames: mean {frame_times.mean():.2f} ms, '
+              f'p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms')
+        raise SystemExit
+
+    # тот же NPC со слотами и его копия на __dict__; каждый набор мерится на своей свежей игре
+    results = {}
+    for name, npc_type in (('dict', get_dict_class(SoldierNPC)), ('slots', SoldierNPC)):
+        game = Game()
+        npcs, memory = measure_memory(game, args.count, npc_type)
+        results[name] = memory, measure_update(game, npcs, args.frames)
+        print(f'{name:>5}: {args.count} npcs, {memory / 1024:.2f} KiB per npc, '
+              f'{results[name][1] * 1e6:.2f} us per npc update')
+    (dict_memory, dict_time), (slots_memory, slots_time) = results['dict'], results['slots']
+    print(f'slots vs dict: {(dict_memory - slots_memory) / 1024:.2f} KiB less per npc '
+          f'({1 - slots_memory / dict_memory:.0%}), update {dict_time / slots_time:.2f}x faster')
@@ -0,0 +1,81 @@
+import numpy as np
+from settings import *
+
+
+class Chunk:
+    # клетки чанка задаются границами: сетка и маски соседей общие для всей карты
+    def __init__(self, key, bounds):
+        self.key = key
+        self.bounds = bounds
+        self.sprites = []
+        self.npcs = []
+
+
+class ChunkedWorld:
+    def __init__(self, game, grid, chunk_size=CHUNK_SIZE):
+        self.game = game
+        self.size = chunk_size
+        rows, cols = grid.shape
+        self.chunks = {}
+        for cy in range(0, rows, chunk_size):
+            for cx in range(0, cols, chunk_size):
+                key = cx // chunk_size, cy // chunk_size
+                self.chunks[key] = Chunk(key, (cx, cy, min(cx + chunk_size, cols), min(cy + chunk_size, rows)))
+        self.active = []
+        self.paged = set()
+        self.center = None
+
+    def get_chunk(self, x, y):
+        return self.chunks.get((int(x) // self.size, int(y) // self.size))
+
+    def get_region(self, center, radius):
+        cx, cy = center
+        return [self.chunks[key] for key in ((x, y) for y in range(cy - radius, cy + radius + 1)
+                                              for x in range(cx - radius, cx + radius + 1))
+                if key in self.chunks]
+
+    def add_sprite(self, sprite):
+        self.get_chunk(sprite.x, sprite.y).sprites.append(sprite)
+
+    def add_npc(self, npc):
+        npc.chunk = self.get_chunk(npc.x, npc.y)
+        npc.chunk.npcs.append(npc)
+
+    def move_npc(self, npc):
+        chunk = self.get_chunk(npc.x, npc.y)
+        if chunk is not npc.chunk:
+            npc.chunk.npcs.remove(npc)
+            chunk.npcs.append(npc)
+            npc.chunk = chunk
+
+    @property
+    def active_sprites(self):
+        return [sprite for chunk in self.active for sprite in chunk.sprites]
+
+    @property
+    def active_npcs(self):
+        return [npc for chunk in self.active for npc in chunk.npcs]
+
+    @property
+    def active_index(self):
+        # строки хранилища сущностей активных чанков: проекция и срез кадра не трогают остальной мир
+        return np.array([entity.index for entity in self.active_sprites + self.active_npcs], dtype=np.intp)
+
+    def update(self):
+        center = self.get_chunk(*self.game.player.pos).key
+        if center == self.center:
+            return
+        self.center = center
+        self.active = self.get_region(center, ACTIVE_CHUNK_RADIUS)
+        self.paged.update(self.active)
+        keep = set(self.get_region(center, PAGE_OUT_CHUNK_RADIUS))
+        for chunk in self.paged - keep:
+            self.page_out(chunk)
+
+    def page_out(self, chunk):
+        # у дальних чанков освобождаются анимации NPC и рёбра абстрактного графа пути;
+        # сетка и маска соседей остаются, рёбра строятся заново при первом поиске через чанк
+        for npc in chunk.npcs:
+            npc.animations.evict(keep=('idle', 'walk') if npc.alive else ('death',))
+        self.game.pathfinding.clusters.evict(*chunk.bounds)
+        self.paged.discard(chunk)
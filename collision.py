@@ -0,0 +1,58 @@
+import math
+import numpy as np
+
+EPSILON = 1e-6
+
+
+def sweep_axis(grid, pos, other, delta, radius):
+    # сдвиг круга вдоль одной оси до первой стены на пути; grid[other, pos] - клетка,
+    # для оси y передаётся grid.T. Проверяются клетки за клеткой центра до конца шага, включая ту,
+    # где уже стоит передний край: край, залезший в стену, выталкивается из неё, а не проходит насквозь
+    if not delta:
+        return pos
+    rows = range(max(int(other - radius), 0), min(math.ceil(other + radius), grid.shape[0]))
+    step = 1 if delta > 0 else -1
+    lead = pos + step * radius
+    last = min(max(math.floor(lead + delta), -1), grid.shape[1])
+    for col in range(math.floor(pos) + step, last + step, step):
+        if not 0 <= col < grid.shape[1] or any(grid[row, col] for row in rows):
+            return col - radius - EPSILON if step > 0 else col + 1 + radius + EPSILON
+    return pos + delta
+
+
+def move_circle(grid, x, y, dx, dy, radius):
+    # круг скользит вдоль стен: сначала по x, затем по y; сквозь стену не пройти при любой скорости
+    x = sweep_axis(grid, x, y, dx, radius)
+    y = sweep_axis(grid.T, y, x, dy, radius)
+    return x, y
+
+
+def sweep_axis_batch(grid, pos, other, delta, radius):
+    # то же, что sweep_axis, но сразу для массивов; цикл идёт по пересекаемым клеткам, а не по объектам
+    rows, cols = grid.shape
+    step = np.where(delta < 0, -1, 1)
+    lead = pos + step * radius
+    start = np.floor(pos).astype(int)
+    crossed = np.abs(np.floor(lead + delta).astype(int) - start)
+    low = np.floor(other - radius).astype(int)
+    span = np.ceil(other + radius).astype(int) - low
+
+    result = pos + delta
+    blocked = np.zeros(len(pos), dtype=bool)
+    for k in range(1, crossed.max(initial=0) + 1):
+        target = start + step * k
+        active = ~blocked & (k <= crossed) & (delta != 0)
+        hit = active & ((target < 0) | (target >= cols))
+        col = np.clip(target, 0, cols - 1)
+        for j in range(span.max(initial=0)):
+            row = np.clip(low + np.minimum(j, span - 1), 0, rows - 1)
+            hit |= active & (grid[row, col] != 0)
+        result[hit] = np.where(step > 0, target - radius - EPSILON, target + 1 + radius + EPSILON)[hit]
+        blocked |= hit
+    return result
+
+
+def move_circles(grid, x, y, dx, dy, radius):
+    x = sweep_axis_batch(grid, x, y, dx, radius)
+    y = sweep_axis_batch(grid.T, y, x, dy, radius)
+    return x, y
@@ -0,0 +1,101 @@
+import struct
+import random
+import numpy as np
+import pygame as pg
+from settings import *
+
+REPLAY_MAGIC = b'RCRP'
+REPLAY_VERSION = 1
+# магия, версия, зерно RNG, число тиков; дальше по два байта на тик
+REPLAY_HEADER = struct.Struct('<4sHQI')
+REPLAY_FRAME = np.dtype([('buttons', 'u1'), ('rel', 'i1')])
+INPUT_KEYS = pg.K_w, pg.K_s, pg.K_a, pg.K_d
+FIRE_BIT = 1 << len(INPUT_KEYS)
+
+
+class InputFrame:
+    # ввод одного тика: keys индексируется кодом клавиши, как pg.key.get_pressed()
+    __slots__ = 'keys', 'rel', 'fire'
+
+    def __init__(self, keys, rel=0, fire=False):
+        self.keys = keys
+        self.rel = rel
+        self.fire = fire
+
+    def encode(self):
+        buttons = sum(1 << i for i, key in enumerate(INPUT_KEYS) if self.keys[key])
+        return buttons | (FIRE_BIT if self.fire else 0), self.rel
+
+    @classmethod
+    def decode(cls, buttons, rel):
+        keys = {key: bool(buttons & 1 << i) for i, key in enumerate(INPUT_KEYS)}
+        return cls(keys, rel, bool(buttons & FIRE_BIT))
+
+
+class Controls:
+    # ввод читается раз в тик симуляции; при записи кадры ввода копятся вместе с зерном RNG
+    replaying = False
+
+    def __init__(self, record_path=None, seed=None):
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.record_path = record_path
+        self.recording = [] if record_path else None
+        self.frame = InputFrame(dict.fromkeys(INPUT_KEYS, False))
+        self.fire = False
+        self.finished = False
+
+    def handle_event(self, event):
+        if event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
+            self.fire = True
+
+    def poll(self):
+        # чтение устройств - только из главного потока, по вызову на каждый тик кадра
+        mx, my = pg.mouse.get_pos()
+        if mx < MOUSE_BORDER_LEFT or mx > MOUSE_BORDER_RIGHT:
+            pg.mouse.set_pos([HALF_WIDTH, HALF_HEIGHT])
+        rel = max(-MOUSE_MAX_REL, min(MOUSE_MAX_REL, pg.mouse.get_rel()[0]))
+        frame = InputFrame(pg.key.get_pressed(), rel, self.fire)
+        self.fire = False
+        return frame
+
+    def apply(self, frame):
+        # кадр ввода становится текущим в начале тика; записывается только реально сыгранный ввод
+        self.frame = frame
+        if self.recording is not None:
+            self.recording.append(frame.encode())
+
+    def save(self, path=None):
+        frames = np.array(self.recording, dtype=REPLAY_FRAME)
+        with open(path or self.record_path, 'wb') as file:
+            file.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, len(frames)))
+            file.write(frames.tobytes())
+
+
+class Replay(Controls):
+    # воспроизведение записи: события мыши игнорируются, по концу записи выставляется finished
+    replaying = True
+
+    def __init__(self, frames, seed):
+        super().__init__(seed=seed)
+        self.frames = frames
+        self.index = 0
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            buffer = file.read()
+        magic, version, seed, count = REPLAY_HEADER.unpack_from(buffer)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f'{path}: not a replay file of version {REPLAY_VERSION}')
+        return cls(np.frombuffer(buffer, REPLAY_FRAME, count, REPLAY_HEADER.size), seed)
+
+    def handle_event(self, event):
+        pass
+
+    def poll(self):
+        if self.index < len(self.frames):
+            buttons, rel = self.frames[self.index].tolist()
+            self.index += 1
+            return InputFrame.decode(buttons, rel)
+        self.finished = True
+        return InputFrame(dict.fromkeys(INPUT_KEYS, False))
@@ -0,0 +1,78 @@
+import numpy as np
+from settings import *
+
+
+class EntityStore:
+    # позиции и проекции всех спрайтов хранятся столбцами и пересчитываются за один проход
+    fields = ('x', 'y', 'prev_x', 'prev_y', 'scale', 'shift', 'half_width',
+              'dx', 'dy', 'theta', 'screen_x', 'dist', 'norm_dist')
+
+    def __init__(self, capacity=256):
+        self.size = 0
+        self.entities = []
+        for name in self.fields:
+            setattr(self, name, np.zeros(capacity))
+        self.visible = np.zeros(capacity, dtype=bool)
+
+    def add(self, entity, x, y, scale, shift, half_width):
+        if self.size == len(self.x):
+            self.grow()
+        index = self.size
+        self.x[index], self.y[index] = self.prev_x[index], self.prev_y[index] = x, y
+        self.scale[index], self.shift[index], self.half_width[index] = scale, shift, half_width
+        self.dist[index] = self.norm_dist[index] = 1
+        self.entities.append(entity)
+        self.size += 1
+        return index
+
+    def grow(self):
+        for name in self.fields + ('visible',):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+
+    def copy(self, index=None):
+        # копия позиций для отрисовки; проекция копии не трогает массивы симуляции.
+        # с index копируются только эти строки, в копии они идут подряд с нуля
+        index = np.arange(self.size) if index is None else np.asarray(index, dtype=np.intp)
+        store = EntityStore(max(len(index), 1))
+        for name in ('x', 'y', 'prev_x', 'prev_y', 'scale', 'shift', 'half_width'):
+            getattr(store, name)[:len(index)] = getattr(self, name)[index]
+        store.size, store.entities = len(index), [self.entities[i] for i in index]
+        return store
+
+    def save_state(self, index=None):
+        index = slice(0, self.size) if index is None else index
+        self.prev_x[index] = self.x[index]
+        self.prev_y[index] = self.y[index]
+
+    def project(self, player, alpha=None, index=None):
+        # то же, что SpriteObject.get_sprite, но сразу для строк index (по умолчанию для всех);
+        # с alpha позиции интерполируются между двумя последними тиками
+        index = slice(0, self.size) if index is None else index
+        x, y = self.x[index], self.y[index]
+        if alpha is not None:
+            x = self.prev_x[index] + (x - self.prev_x[index]) * alpha
+            y = self.prev_y[index] + (y - self.prev_y[index]) * alpha
+        dx, dy = x - player.x, y - player.y
+        theta = np.arctan2(dy, dx)
+
+        delta = theta - player.angle
+        delta[((dx > 0) & (player.angle > math.pi)) | ((dx < 0) & (dy < 0))] += math.tau
+        screen_x = (HALF_NUM_RAYS + delta / DELTA_ANGLE) * SCALE
+
+        dist = np.hypot(dx, dy)
+        norm_dist = dist * np.cos(delta)
+        half_width = self.half_width[index]
+        self.dx[index], self.dy[index], self.theta[index] = dx, dy, theta
+        self.screen_x[index], self.dist[index], self.norm_dist[index] = screen_x, dist, norm_dist
+        self.visible[index] = (-half_width < screen_x) & (screen_x < WIDTH + half_width) & (norm_dist > 0.5)
+
+
+def entity_field(name):
+    # атрибут объекта, который читается и пишется прямо в массив хранилища
+    def get(self):
+        return getattr(self.store, name)[self.index]
+
+    def set(self, value):
+        getattr(self.store, name)[self.index] = value
+    return property(get, set)
@@ -0,0 +1,64 @@
+import os
+import queue
+import struct
+import threading
+import zlib
+import numpy as np
+import pygame as pg
+from settings import *
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def encode_png(pixels, size):
+    # PNG из сырых RGB-байтов; сжатие идёт в zlib, который отпускает GIL, поэтому
+    # фоновый поток кодирования не забирает интерпретатор у цикла игры
+    width, height = size
+    rows = np.frombuffer(pixels, np.uint8).reshape(height, width * 3)
+    scanlines = np.hstack([np.zeros((height, 1), np.uint8), rows]).tobytes()
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (PNG_SIGNATURE + png_chunk(b'IHDR', header) +
+            png_chunk(b'IDAT', zlib.compress(scanlines, EXPORT_PNG_LEVEL)) + png_chunk(b'IEND', b''))
+
+
+class FrameExporter:
+    # кадры копируются в байты в потоке отрисовки, а кодируются и пишутся на диск в фоновом потоке;
+    # при полной очереди кадр пропускается, чтобы запись никогда не тормозила цикл игры
+    def __init__(self, directory, fmt='png', max_queue=EXPORT_QUEUE_SIZE):
+        if fmt not in ('png', 'raw'):
+            raise ValueError(f'unknown frame format: {fmt}')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fmt = fmt
+        self.queue = queue.Queue(max_queue)
+        self.frame_index = 0
+        self.dropped = 0
+        self.stream = open(os.path.join(directory, 'frames.rgb'), 'wb') if fmt == 'raw' else None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, surface):
+        try:
+            self.queue.put_nowait((self.frame_index, surface.get_size(), pg.image.tobytes(surface, 'RGB')))
+        except queue.Full:
+            self.dropped += 1
+        self.frame_index += 1
+
+    def run(self):
+        while (item := self.queue.get()) is not None:
+            index, size, pixels = item
+            if self.stream is not None:
+                self.stream.write(pixels)
+            else:
+                with open(os.path.join(self.directory, f'frame_{index:06d}.png'), 'wb') as file:
+                    file.write(encode_png(pixels, size))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.stream is not None:
+            self.stream.close()
@@ -0,0 +1,34 @@
+import pygame as pg
+from settings import *
+
+
+class Hud:
+    # слои интерфейса перерисовываются только при смене значения, а кадр выводит их одним вызовом blits
+    def __init__(self, game):
+        self.game = game
+        self.digits = game.object_renderer.digits
+        self.digit_size = game.object_renderer.digit_size
+        self.health = None
+        self.health_image = None
+        self.layers = []
+
+    def get_number_image(self, value):
+        # число и знак процента в одной поверхности
+        text = str(value)
+        size = self.digit_size
+        surface = pg.Surface(((len(text) + 1) * size, size), pg.SRCALPHA)
+        glyphs = [self.digits[char] for char in text] + [self.digits['10']]
+        surface.blits([(glyph, (i * size, 0)) for i, glyph in enumerate(glyphs)], doreturn=False)
+        return surface
+
+    def update(self, snapshot):
+        # последний кадр эпизода рисуется до перезапуска, здоровье в нём может быть отрицательным
+        health = max(snapshot.health, 0)
+        if health != self.health:
+            self.health = health
+            self.health_image = self.get_number_image(self.health)
+        self.layers = [(self.health_image, (0, 0)), (snapshot.weapon, self.game.weapon.weapon_pos)]
+
+    def draw(self):
+        self.update(self.game.snapshot)
+        self.game.screen.blits(self.layers, doreturn=False)
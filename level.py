@@ -0,0 +1,108 @@
+import numpy as np
+import argparse
+import struct
+from settings import *
+
+LEVEL_MAGIC = b'RCLV'
+LEVEL_VERSION = 1
+LEVEL_HEADER = struct.Struct('<4sHHHIIff')
+ENTITY_DTYPE = np.dtype([('kind', 'u1'), ('x', '<f4'), ('y', '<f4')])
+
+SPRITE_KINDS = (
+    'animated_sprites/green_light/0.png',
+    'animated_sprites/red_light/0.png',
+    'static_sprites/candlebra.png',
+)
+NPC_KINDS = ('soldier', 'caco_demon', 'cyber_demon')
+NPC_WEIGHTS = (70, 20, 10)
+
+
+class Level:
+    def __init__(self, grid, sprites=(), npcs=(), player_pos=PLAYER_POS, copy=True):
+        # copy=False оставляет переданную сетку как есть, например общую память нескольких процессов
+        self.grid = np.array(grid, dtype=np.uint8) if copy else np.asarray(grid, dtype=np.uint8)
+        self.sprites = np.array(list(sprites), dtype=ENTITY_DTYPE)
+        self.npcs = np.array(list(npcs), dtype=ENTITY_DTYPE)
+        self.player_pos = tuple(player_pos)
+
+    @property
+    def rows(self):
+        return self.grid.shape[0]
+
+    @property
+    def cols(self):
+        return self.grid.shape[1]
+
+    @classmethod
+    def from_mini_map(cls, mini_map, sprites=(), player_pos=PLAYER_POS):
+        sprites = [(SPRITE_KINDS.index(kind), x, y) for kind, x, y in sprites]
+        return cls(np.array(mini_map, dtype=np.uint8), sprites, player_pos=player_pos)
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            file.write(LEVEL_HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, self.cols, self.rows,
+                                         len(self.sprites), len(self.npcs), *self.player_pos))
+            file.write(self.grid.tobytes())
+            file.write(self.sprites.tobytes())
+            file.write(self.npcs.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+        magic, version, cols, rows, num_sprites, num_npcs, player_x, player_y = LEVEL_HEADER.unpack_from(data)
+        if magic != LEVEL_MAGIC or version != LEVEL_VERSION:
+            raise ValueError(f'{path}: not a level file of version {LEVEL_VERSION}')
+        offset = LEVEL_HEADER.size
+        grid = np.frombuffer(data, np.uint8, rows * cols, offset).reshape(rows, cols)
+        offset += grid.nbytes
+        sprites = np.frombuffer(data, ENTITY_DTYPE, num_sprites, offset)
+        offset += sprites.nbytes
+        npcs = np.frombuffer(data, ENTITY_DTYPE, num_npcs, offset)
+        return cls(grid, sprites, npcs, (player_x, player_y))
+
+
+def generate_level(cols, rows, seed=None, room_size=(3, 10), sprite_density=0.01, npc_density=0.02):
+    rng = np.random.default_rng(seed)
+    grid = rng.integers(1, len(WALL_TEXTURES) + 1, size=(rows, cols), dtype=np.uint8)
+    free = np.zeros((rows, cols), dtype=bool)
+
+    # комнаты, соединённые коридорами в порядке создания
+    num_rooms = max(2, cols * rows // (room_size[1] ** 2 * 2))
+    widths = rng.integers(*room_size, size=num_rooms)
+    heights = rng.integers(*room_size, size=num_rooms)
+    lefts = rng.integers(1, np.maximum(cols - widths - 1, 2))
+    tops = rng.integers(1, np.maximum(rows - heights - 1, 2))
+    centers_x = np.minimum(lefts + widths // 2, cols - 2)
+    centers_y = np.minimum(tops + heights // 2, rows - 2)
+    for left, top, width, height in zip(lefts, tops, widths, heights):
+        free[top:min(top + height, rows - 1), left:min(left + width, cols - 1)] = True
+    for x0, y0, x1, y1 in zip(centers_x[:-1], centers_y[:-1], centers_x[1:], centers_y[1:]):
+        free[y0, min(x0, x1):max(x0, x1) + 1] = True
+        free[min(y0, y1):max(y0, y1) + 1, x1] = True
+    grid[free] = 0
+
+    player_pos = centers_x[0] + 0.5, centers_y[0] + 0.5
+    ys, xs = np.nonzero(free)
+    far = np.hypot(xs + 0.5 - player_pos[0], ys + 0.5 - player_pos[1]) > 5
+    sprite_cells = rng.choice(len(xs), size=int(len(xs) * sprite_density), replace=False)
+    npc_cells = rng.choice(np.flatnonzero(far), size=min(int(len(xs) * npc_density), far.sum()), replace=False)
+
+    sprites = np.zeros(len(sprite_cells), dtype=ENTITY_DTYPE)
+    sprites['kind'] = rng.integers(0, 2, size=len(sprite_cells))
+    sprites['x'], sprites['y'] = xs[sprite_cells] + 0.5, ys[sprite_cells] + 0.5
+    npcs = np.zeros(len(npc_cells), dtype=ENTITY_DTYPE)
+    npcs['kind'] = rng.choice(len(NPC_KINDS), size=len(npc_cells), p=np.array(NPC_WEIGHTS) / sum(NPC_WEIGHTS))
+    npcs['x'], npcs['y'] = xs[npc_cells] + 0.5, ys[npc_cells] + 0.5
+    return Level(grid, sprites, npcs, player_pos)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Генерация случайного уровня')
+    parser.add_argument('path')
+    parser.add_argument('--size', type=int, nargs=2, default=(256, 256), metavar=('COLS', 'ROWS'))
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    level = generate_level(*args.size, seed=args.seed)
+    level.save(args.path)
+    print(f'{args.path}: {level.cols}x{level.rows}, {len(level.sprites)} sprites, {len(level.npcs)} npcs')
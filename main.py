@@ -1,55 +1,186 @@
 import pygame as pg
 import sys
+import argparse
+import random
+from concurrent.futures import ThreadPoolExecutor
 from settings import *
+from asset_cache import *
 from map import *
+from level import *
 from player import *
 from raycasting import *
 from objects import *
 from sprite_object import *
 from weapon import *
 from pathfinding import *
+from shading import *
+from entities import *
+from snapshot import *
+from minimap import *
+from hud import *
+from controls import *
+from export import *
 
 
 class Game:
-    def __init__(self):
-        # Инициализация игры
+    def __init__(self, level_path=None, pipelined=PIPELINED, controls=None, exporter=None, level=None):
+        # Инициализация игры; controls задаёт источник ввода - живой, с записью или воспроизведение
         pg.init()
         self.screen = pg.display.set_mode(RES)
         self.clock = pg.time.Clock()
-        self.delta_time = 1
+        self.delta_time = TICK_TIME
+        self.frame_time = 0
+        self.accumulator = 0
+        self.executor = ThreadPoolExecutor(max_workers=1) if pipelined else None
+        self.simulation = None
         self.global_trigger = False
-        self.global_event = pg.USEREVENT + 0
-        pg.time.set_timer(self.global_event, 40)
         self.game_active = False
-        self.menu_background = pg.image.load("resources/textures/sky.png").convert()
+        assets.prepare()
+        self.menu_background = assets.texture('resources/textures/sky.png', RES, alpha=False)
+        self.level = Level.load(level_path) if level_path else level
+        self.controls = controls or Controls()
+        self.exporter = exporter
+        self.random = random.Random()
         self.new_game()
 
     def new_game(self):
-        # Создание игровых объектов
-        self.map = Map(self)
-        self.player = Player(self)
+        # Создание игровых объектов; вызывается только из главного потока.
+        # у каждой игры свой генератор: миры в одном процессе не делят поток случайных чисел,
+        # и каждый эпизод начинается с того же seed
+        self.random.seed(self.controls.seed)
+        self.outcome = None
+        self.time = 0
+        self.entities = EntityStore()
+        self.map = Map(self, self.level)
+        self.player = Player(self, self.map.level.player_pos)
+        self.camera = Camera(self.player)
         self.object_renderer = ObjectRenderer(self)
         self.raycasting = RayCasting(self)
         self.object_handler = ObjectHandler(self)
         self.weapon = Weapon(self)
         self.pathfinding = PathFinding(self)
+        self.shading = Shading(self)
+        self.snapshot = FrameSnapshot(self, 0)
+        self.minimap = Minimap(self)
+        self.hud = Hud(self)
 
     def update(self):
-        # Обновление логики игры
+        # Обновление логики игры: симуляция идёт тиками фиксированной длины, кадр строится
+        # из среза между двумя последними тиками; в конвейерном режиме следующий срез
+        # считается в отдельном потоке, пока рисуется текущий
         if self.game_active:
-            self.player.update()
+            frames, alpha = self.poll_input(self.frame_time)
+            if self.executor is None:
+                self.snapshot = self.simulate(frames, alpha)
+            else:
+                self.simulation = self.executor.submit(self.simulate, frames, alpha)
+
+            snapshot = self.snapshot
+            self.camera.interpolate(snapshot.prev_state, snapshot.state, snapshot.alpha)
             self.raycasting.update()
-            self.object_handler.update()
-            self.weapon.update()
+            self.object_handler.render(snapshot)
             pg.display.flip()
-            self.delta_time = self.clock.tick(FPS)
+            # запись воспроизводится с максимальной скоростью, ровно по тику за кадр
+            self.frame_time = self.clock.tick(0 if self.controls.replaying else FPS)
+            if self.controls.replaying:
+                self.frame_time = TICK_TIME
             pg.display.set_caption(f'{self.clock.get_fps() :.1f}')
 
+    def poll_input(self, frame_time):
+        # Число тиков кадра и ввод для каждого из них считаются в главном потоке,
+        # поток симуляции получает готовые кадры ввода и не трогает pygame
+        self.accumulator += frame_time
+        ticks = min(int(self.accumulator // TICK_TIME), MAX_TICKS_PER_FRAME)
+        self.accumulator = min(self.accumulator - ticks * TICK_TIME, TICK_TIME)
+        frames = []
+        for _ in range(ticks):
+            frame = self.controls.poll()
+            if self.controls.finished:
+                break
+            frames.append(frame)
+        return frames, self.accumulator / TICK_TIME
+
+    def simulate(self, frames, alpha):
+        # после конца эпизода оставшиеся тики кадра не играются и не попадают в запись
+        for frame in frames:
+            if self.done:
+                break
+            self.tick(frame)
+        return FrameSnapshot(self, alpha)
+
+    def sync(self):
+        # Конец кадра: срез, посчитанный в потоке симуляции, становится текущим;
+        # итог эпизода показывается и игра перезапускается здесь же, в главном потоке
+        if self.simulation is not None:
+            self.snapshot = self.simulation.result()
+            self.simulation = None
+        if self.done:
+            self.show_outcome()
+            self.new_game()
+
+    def show_outcome(self):
+        if self.outcome == 'win':
+            self.object_renderer.win()
+        pg.display.flip()
+        pg.time.delay(1500)
+
+    @property
+    def done(self):
+        return self.outcome is not None
+
+    def tick(self, frame):
+        # Один шаг симуляции длиной TICK_TIME с кадром ввода frame
+        self.time += TICK_TIME
+        # такт анимации смерти считается от времени симуляции, а не от таймера событий
+        self.global_trigger = self.time // GLOBAL_TRIGGER_TIME != (self.time - TICK_TIME) // GLOBAL_TRIGGER_TIME
+        self.controls.apply(frame)
+        self.player.save_state()
+        self.entities.save_state(self.map.world.active_index)
+        self.player.update()
+        self.object_handler.update()
+        self.pathfinding.update()
+        self.weapon.update()
+
     def draw(self):
         # Отрисовка объектов игры
         if self.game_active:
             self.object_renderer.draw()
-            self.weapon.draw()
+            self.hud.draw()
+            self.minimap.draw()
+            if self.exporter is not None:
+                self.exporter.submit(self.screen)
+            self.sync()
+
+    def render_frame(self, pose=None, surface=None):
+        # кадр без окна: рисуется в surface (по умолчанию новая поверхность размером RES);
+        # pose = (x, y, angle) ставит камеру, иначе берётся поза из текущего среза
+        surface = pg.Surface(RES) if surface is None else surface
+        screen, self.screen = self.screen, surface
+        self.object_renderer.screen = surface
+        # состояние живого кадра: после рендера оно возвращается как было
+        camera = self.camera.x, self.camera.y, self.camera.angle
+        raycasting = self.raycasting.ray_casting_result, self.raycasting.objects_to_render
+        sky_offset = self.object_renderer.sky_offset
+        try:
+            snapshot = self.snapshot
+            if pose is None:
+                self.camera.interpolate(snapshot.prev_state, snapshot.state, snapshot.alpha)
+            else:
+                self.camera.x, self.camera.y, self.camera.angle = pose
+            self.raycasting.update()
+            self.object_handler.render(snapshot)
+            self.object_renderer.draw()
+            self.hud.draw()
+        finally:
+            self.screen = self.object_renderer.screen = screen
+            self.camera.x, self.camera.y, self.camera.angle = camera
+            self.raycasting.ray_casting_result, self.raycasting.objects_to_render = raycasting
+            self.object_renderer.sky_offset = sky_offset
+        return surface
+
+    def render_array(self, pose=None):
+        # то же в виде массива (высота, ширина, RGB)
+        return pg.surfarray.array3d(self.render_frame(pose)).swapaxes(0, 1)
 
     def game_events(self):
         # Обработка всех событий игры
@@ -58,9 +189,8 @@ class Game:
                 pg.quit()
                 sys.exit()
             elif self.game_active:
-                if event.type == self.global_event:
-                    self.global_trigger = True
-                self.player.single_fire_event(event)
+                self.controls.handle_event(event)
+                self.minimap.toggle_event(event)
             else:
                 self.menu_events(event)
 
@@ -88,7 +218,7 @@ class Game:
 
     def draw_menu(self):
         # Отрисовка меню с кнопками
-        self.screen.blit(pg.transform.scale(self.menu_background, RES), (0, 0))
+        self.screen.blit(self.menu_background, (0, 0))
         font = pg.font.Font(None, 74)
         play_text = font.render("Играть", True, (255, 255, 255))
         quit_text = font.render("Выйти", True, (255, 255, 255))
@@ -115,5 +245,19 @@ class Game:
 
 
 if __name__ == '__main__':
-    game = Game()
-    game.run()
+    parser = argparse.ArgumentParser(description='Рейкастер')
+    parser.add_argument('level', nargs='?')
+    parser.add_argument('--record', help='записать ввод в файл для воспроизведения')
+    parser.add_argument('--export', help='каталог для записи кадров')
+    parser.add_argument('--export-format', choices=('png', 'raw'), default='png')
+    args = parser.parse_args()
+
+    exporter = FrameExporter(args.export, args.export_format) if args.export else None
+    game = Game(args.level, controls=Controls(args.record), exporter=exporter)
+    try:
+        game.run()
+    finally:
+        if args.record:
+            game.controls.save()
+        if exporter is not None:
+            exporter.close()
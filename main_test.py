@@ -6,16 +6,77 @@ import math
 from weapon import Weapon
 from sprite_object import SpriteObject, AnimatedSprite
 from raycasting import RayCasting
-from player import Player
-from pathfinding import PathFinding
+from player import Player, Camera
+from pathfinding import PathFinding, ClusterGraph
 from objects import ObjectHandler, ObjectRenderer
-from npc import NPC
-from map import Map
+from npc import NPC, SoldierNPC
+from map import Map, mini_map
 from main import Game
+from shading import Shading
+from atlas import TextureAtlas
+from asset_cache import AssetCache, assets
+from level import Level, generate_level
+from chunks import ChunkedWorld
+from entities import EntityStore
+from minimap import Minimap
+from hud import Hud
+from collision import move_circle, move_circles
+from controls import Controls, Replay, InputFrame
+from export import FrameExporter
+from server import SharedGrid, World, WorldServer
+from benchmark import get_dict_class, measure_memory
+import pickle
+import numpy as np
+import os
+import sys
+import subprocess
+import tempfile
+import time
+from settings import SCALE, PLAYER_SIZE, SHADING_ROW_STEP, NUM_RAYS, WIDTH, HALF_WIDTH, HEIGHT, HALF_HEIGHT, FLOOR_COLOR, RES, SCREEN_DIST, SPRITE_COLORKEY, ANIMATION_EVICT_DIST, TICK_TIME, VIEW_SIZE, GLOBAL_TRIGGER_TIME, SKY_REPEAT
+
+# бенчмарки медленные и зависят от машины - запускаются только с BENCHMARK=1
+benchmark = unittest.skipUnless(os.environ.get('BENCHMARK'), 'set BENCHMARK=1 to run benchmarks')
+
+
+def setUpModule():
+    # одно окно без вывода и один кэш ресурсов на все тесты вместо pg.init()/pg.quit() в каждом
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pg.init()
+    pg.display.set_mode(RES)
+    assets.prepare()
+
+
+def tearDownModule():
+    pg.quit()
+
+
+def make_game(**kwargs):
+    # настоящая игра без окна с фиксированным зерном; текстуры и атласы стен берутся из кэша процесса
+    kwargs.setdefault('controls', Controls(seed=0))
+    return Game(**kwargs)
+
+
+def make_fake_game(grid=None, player_pos=(1.5, 1.5), angle=0):
+    # лёгкая замена Game для RayCasting, PathFinding и NPC: карта из сетки, игрок и пустое окружение
+    game = Mock()
+    grid = np.array(grid if grid is not None else [[0] * 4] * 4, dtype=np.uint8)
+    game.map.grid = grid
+    game.map.world_map = {(x, y): int(grid[y, x]) for y, x in zip(*np.nonzero(grid))}
+    game.entities = EntityStore()
+    game.time = 0
+    game.player.x, game.player.y = player_pos
+    game.player.pos = player_pos
+    game.player.map_pos = int(player_pos[0]), int(player_pos[1])
+    game.player.angle = angle
+    game.camera = game.player
+    game.object_handler.get_nearby_npcs.return_value = []
+    return game
+
 
 class TestGame(unittest.TestCase):
     def setUp(self):
-        self.game = Game()
+        self.game = make_game()
 
     @patch('pygame.display.set_mode')
     @patch('pygame.init')
@@ -24,6 +85,67 @@ class TestGame(unittest.TestCase):
         mock_pg_init.assert_called_once()
         mock_set_mode.assert_called_once()
 
+    @patch.object(Game, 'tick')
+    def test_update_fixed_timestep(self, mock_tick):
+        self.game.game_active = True
+        self.game.frame_time = 3.5 * TICK_TIME
+        self.game.update()
+
+        self.assertEqual(mock_tick.call_count, 3)
+        self.assertAlmostEqual(self.game.accumulator, 0.5 * TICK_TIME)
+
+    @patch.object(Game, 'tick')
+    def test_simulate_stops_when_done(self, mock_tick):
+        def finish(frame):
+            self.game.outcome = 'lose'
+        mock_tick.side_effect = finish
+        self.game.simulate([Mock(), Mock(), Mock()], 0)
+        self.assertEqual(mock_tick.call_count, 1)
+
+    @patch('main.pg.time.delay')
+    @patch('main.pg.display.flip')
+    def test_sync_outcome(self, mock_display_flip, mock_time_delay):
+        player = self.game.player
+        self.game.outcome = 'win'
+        self.game.sync()
+        mock_display_flip.assert_called_once()
+        mock_time_delay.assert_called_once_with(1500)
+        self.assertFalse(self.game.done)
+        self.assertIsNot(self.game.player, player)
+
+    def test_pipelined_update(self):
+        game = make_game(pipelined=True)
+        game.game_active = True
+        snapshot = game.snapshot
+        game.frame_time = 2 * TICK_TIME
+        game.update()
+        self.assertIs(game.snapshot, snapshot)
+
+        game.draw()
+        self.assertIsNot(game.snapshot, snapshot)
+        self.assertIsNone(game.simulation)
+        game.executor.shutdown()
+
+    def test_render_frame(self):
+        screen, camera = self.game.screen, self.game.camera
+        live = camera.x, camera.y, camera.angle
+        pose = 3.5, 5.5, 1.0
+        frame = self.game.render_array(pose)
+
+        self.assertIs(self.game.screen, screen)
+        self.assertEqual(frame.shape, (RES[1], RES[0], 3))
+        self.assertEqual((camera.x, camera.y, camera.angle), live)
+
+        # кадр зависит только от позы: поворот мыши между вызовами не сдвигает небо
+        self.game.player.rel = 10
+        np.testing.assert_array_equal(self.game.render_array(pose), frame)
+
+    def test_render_views(self):
+        frames = self.game.raycasting.render_views([(3.5, 5.5, 0.0), (3.5, 5.5, 1.0)], size=(32, 18))
+        self.assertEqual(frames.shape, (2, 18, 32, 3))
+        self.assertEqual(frames.dtype, np.uint8)
+        self.assertFalse(np.array_equal(frames[0], frames[1]))
+
     @patch('pygame.event.get')
     def test_game_events_quit(self, mock_pg_event_get):
         mock_pg_event_get.return_value = [Mock(type=pg.QUIT)]
@@ -36,11 +158,13 @@ class TestGame(unittest.TestCase):
         with self.assertRaises(SystemExit):
             self.game.game_events()
 
-    @patch('pygame.event.get')
-    def test_game_events_global_event(self, mock_pg_event_get):
-        mock_pg_event_get.return_value = [Mock(type=self.game.global_event)]
-        self.game.game_events()
-        self.assertTrue(not(self.game.global_trigger))
+    def test_global_trigger(self):
+        # такт анимации смерти идёт от времени симуляции: раз в GLOBAL_TRIGGER_TIME мс
+        triggers = []
+        for _ in range(12):
+            self.game.tick(self.game.controls.frame)
+            triggers.append(self.game.global_trigger)
+        self.assertEqual(sum(triggers), int(self.game.time // GLOBAL_TRIGGER_TIME))
 
     @patch('pygame.mouse.get_pos')
     @patch('pygame.event.get')
@@ -77,17 +201,13 @@ class TestMap(unittest.TestCase):
 
     def setUp(self):
         # Инициализация pygame (так как используется для рисования)
-        pg.init()
-        self.screen = pg.display.set_mode((800, 600))  # иниц дисплея
+        self.screen = pg.display.get_surface()
         self.mock_game = Mock()
         self.mock_game.screen = self.screen  # экран для отрисовки
 
         # мок карта
         self.map = Map(self.mock_game)
 
-    def tearDown(self):
-        pg.quit()
-
     def test_initialization(self):
         # тест иниц карты
         self.assertEqual(self.map.rows, len(self.map.mini_map))
@@ -111,30 +231,65 @@ class TestMap(unittest.TestCase):
         # проверка вызова доя всех блоков
         self.assertEqual(mock_draw_rect.call_count, len(self.map.world_map))
 
+    def test_set_cell(self):
+        self.map.set_cell(1, 1, 0)
+        self.assertNotIn((1, 1), self.map.world_map)
+        self.assertEqual(self.map.grid[1, 1], 0)
+
+        self.map.set_cell(1, 1, 2)
+        self.assertEqual(self.map.world_map[(1, 1)], 2)
+        self.mock_game.pathfinding.update_cell.assert_called_with(1, 1)
+
+    def test_set_cell_keeps_level(self):
+        # правки карты не переживают перезапуск: уровень хранит исходную сетку
+        self.map.set_cell(0, 0, 0)
+        self.assertEqual(self.map.level.grid[0, 0], 1)
+        self.assertEqual(Map(self.mock_game, self.map.level).grid[0, 0], 1)
+
 
 class TestNPC(unittest.TestCase):
 
     def setUp(self):
-        # иниц pygame для графики
-        pg.init()
-        pg.display.set_mode((800, 600))  # создает экран для работы
-
         # mock для игровой логики
-        self.mock_game = Mock()
-        self.mock_game.player.get_pos.return_value = (400, 400)  # позиция игрока
+        self.mock_game = make_fake_game(player_pos=(1.5, 1.5))
         self.mock_game.objects = []  # тестовая сцена
 
         # пример нпс 
         self.npc = NPC(self.mock_game)
 
-    def tearDown(self):
-        pg.quit()
-
     def test_initialization(self):
         self.assertTrue(self.npc.alive)
         self.assertEqual(self.npc.health, 100)  
         self.assertEqual(self.npc.speed, 0.03)
-        self.assertEqual(self.npc.size, 20)
+        self.assertEqual(self.npc.size, 0.3)
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.npc, '__dict__'))
+        self.assertIs(self.npc.animations.paths, NPC(self.mock_game).animations.paths)
+
+    def test_lazy_animations(self):
+        self.assertEqual(self.npc.animations.images, {})
+        walk_images = self.npc.walk_images
+        self.assertIs(self.npc.walk_images, walk_images)
+        self.assertEqual(list(self.npc.animations.images), ['walk'])
+
+    def test_separation(self):
+        other = NPC(self.mock_game, pos=(10.8, 5.5))
+        self.mock_game.object_handler.get_nearby_npcs.return_value = [self.npc, other]
+        push_x, push_y = self.npc.get_separation(self.npc.x, self.npc.y)
+
+        self.assertLess(push_x, 0)
+        self.assertEqual(push_y, 0)
+
+    def test_stream_animations_evicts_far(self):
+        self.npc.attack_images
+        self.npc.idle_images
+        self.npc.dist = ANIMATION_EVICT_DIST + 1
+
+        paths = self.npc.stream_animations()
+
+        self.assertEqual(list(self.npc.animations.images), ['idle'])
+        self.assertEqual(paths, [self.npc.path + '/idle'])
 
 
 class TestObjectHandler(unittest.TestCase):
@@ -144,14 +299,41 @@ class TestObjectHandler(unittest.TestCase):
         self.mock_game.get_score.return_value = 5
         self.mock_game.win_score = 10 
 
-        self.handler = ObjectHandler(self.mock_game)
+        with patch.object(ObjectHandler, 'load_level'):
+            self.handler = ObjectHandler(self.mock_game)
+
+    def test_get_nearby_npcs(self):
+        near, far = Mock(), Mock()
+        self.handler.npc_grid = {(4, 5): [near], (7, 5): [far]}
+        self.assertEqual(self.handler.get_nearby_npcs(5.5, 5.5), [near])
+
+    def test_hitscan(self):
+        self.mock_game.entities = EntityStore()
+        self.mock_game.player.shot = True
+        self.mock_game.weapon.damage = 50
+        # стена в пяти клетках перед игроком: глубину даёт центральный луч из позы игрока
+        self.mock_game.map.grid = np.zeros((3, 8), dtype=np.uint8)
+        self.mock_game.map.grid[:, 6] = 1
+        self.mock_game.player.x, self.mock_game.player.y, self.mock_game.player.angle = 1.0, 1.5, 0.0
+        store = self.mock_game.entities
+        npcs = [Mock(alive=True, index=store.add(None, 0, 0, 1, 0, 0), norm_dist=dist, screen_x=HALF_WIDTH,
+                     SPRITE_SCALE=0.6, IMAGE_RATIO=1) for dist in (3, 2, 6)]
+        store.visible[:3] = True
+
+        # попадает ближайший NPC независимо от порядка, дальний за стеной не рассматривается
+        self.assertIs(self.handler.hitscan(npcs), npcs[1])
+        npcs[1].hit.assert_called_once_with(50)
+        self.assertFalse(self.mock_game.player.shot)
+        self.assertIsNone(self.handler.hitscan(npcs))
+
+        self.mock_game.player.shot = True
+        npcs[0].screen_x = npcs[1].screen_x = 0
+        self.assertIsNone(self.handler.hitscan(npcs))
+        self.assertTrue(self.mock_game.player.shot)
 
 class TestObjectRenderer(unittest.TestCase):
 
     def setUp(self):
-        pg.init()
-        pg.display.set_mode((800, 600))
-
         # мок игры
         self.mock_game = Mock()
         self.mock_game.screen = pg.display.get_surface()
@@ -163,25 +345,31 @@ class TestObjectRenderer(unittest.TestCase):
         self.renderer.digits = {str(i): pg.Surface((20, 20)) for i in range(10)}
         self.renderer.win_image = pg.Surface((400, 200)) 
 
-    def tearDown(self):
-        pg.quit()
+    def test_draw_background(self):
+        self.mock_game.player.rel = 0
+        sky = pg.Surface((WIDTH, HALF_HEIGHT))
+        sky.fill('red', (0, 0, WIDTH // 2, HALF_HEIGHT))
+        sky.fill('blue', (WIDTH // 2, 0, WIDTH - WIDTH // 2, HALF_HEIGHT))
+        self.renderer.sky_image = sky
+        self.renderer.background = self.renderer.get_background()
+        self.renderer.screen = pg.Surface(RES)
+
+        # поворот на половину ширины неба: слева синяя половина неба, справа снова красная
+        self.mock_game.camera.angle = math.tau / (2 * SKY_REPEAT)
+        self.renderer.draw_background()
+        self.assertEqual(self.renderer.screen.get_at((0, 0)), pg.Color('blue'))
+        self.assertEqual(self.renderer.screen.get_at((WIDTH - 1, 0)), pg.Color('red'))
+        self.assertEqual(self.renderer.screen.get_at((0, HEIGHT - 1)), pg.Color(*FLOOR_COLOR))
 
 
 class TestPathFinding(unittest.TestCase):
     def setUp(self):
-        self.mock_game = Mock()
-        self.mock_game.map.mini_map = [
+        self.mock_game = make_fake_game([
             [0, 0, 0, 0],
             [0, 1, 1, 0],
             [0, 1, 0, 0],
             [0, 0, 0, 0]
-        ]
-        self.mock_game.map.world_map = {
-            (1, 1): 1,
-            (1, 2): 1,
-            (2, 1): 1
-        }
-        self.mock_game.object_handler.npc_positions = set()
+        ])
 
         self.pathfinding = PathFinding(self.mock_game)
 
@@ -193,25 +381,25 @@ class TestPathFinding(unittest.TestCase):
         self.assertNotIn((1, 1), graph) 
         self.assertIn((0, 3), graph)
 
+    def test_get_graph_neighbors(self):
+        graph = self.pathfinding.graph
+
+        self.assertEqual(sorted(graph[(0, 0)]), [(0, 1), (1, 0)])
+        self.assertEqual(sorted(graph[(2, 2)]), [(1, 3), (2, 3), (3, 1), (3, 2), (3, 3)])
+
     def test_bfs(self):
-        graph = {
-            (0, 0): [(0, 1), (1, 0)],
-            (0, 1): [(0, 0), (1, 1)],
-            (1, 0): [(0, 0), (1, 1)],
-            (1, 1): [(0, 1), (1, 0)]
-        }
-        start = (0, 0)
-        goal = (1, 1)
+        start = self.pathfinding.node_id((0, 0))
+        goal = self.pathfinding.node_id((2, 2))
 
-        visited = self.pathfinding.bfs(start, goal, graph)
-        self.assertIn(goal, visited) 
-        self.assertEqual(visited[goal], (0, 1))
+        visited = self.pathfinding.bfs(start, goal)
+        self.assertIn(goal, visited)
+        self.assertIn(self.pathfinding.node_pos(visited[goal]), self.pathfinding.graph[(2, 2)])
 
     @patch.object(PathFinding, 'bfs', return_value={
-        (3, 0): (2, 0),
-        (2, 0): (1, 0),
-        (1, 0): (0, 0),
-        (0, 0): None
+        3: 2,
+        2: 1,
+        1: 0,
+        0: None
     })
     def test_get_path(self, mock_bfs):
         start = (0, 0)
@@ -220,6 +408,81 @@ class TestPathFinding(unittest.TestCase):
 
         self.assertEqual(path, (1, 0))
 
+    def test_request_limit(self):
+        # за тик обслуживается не больше limit запросов, устаревшие цели не в счёт
+        self.mock_game.player.map_pos = (3, 3)
+        pathfinding = PathFinding(self.mock_game, limit=1)
+        pathfinding.request_path((0, 1), (2, 2))
+        for start in ((0, 0), (3, 0), (0, 3)):
+            pathfinding.request_path(start, (3, 3))
+        pathfinding.update()
+        self.assertEqual(len(pathfinding.requests), 2)
+        pathfinding.update()
+        pathfinding.update()
+        self.assertEqual(pathfinding.requests, {})
+        self.assertEqual(len(pathfinding.paths), 3)
+
+    def test_update_cell(self):
+        rng = np.random.default_rng(0)
+        self.mock_game.map.grid = rng.integers(0, 2, size=(12, 10))
+        pathfinding = PathFinding(self.mock_game)
+        for x, y in rng.integers(0, 10, size=(20, 2)):
+            pathfinding.map[y, x] ^= 1
+            pathfinding.update_cell(x, y)
+        masks = pathfinding.neighbor_grid.copy()
+        pathfinding.get_graph()
+
+        np.testing.assert_array_equal(pathfinding.neighbor_grid, masks)
+
+    def test_hierarchical_path(self):
+        level = generate_level(48, 40, seed=3, room_size=(3, 6))
+        self.mock_game.map.grid = level.grid
+        pathfinding = PathFinding(self.mock_game)
+        pathfinding.clusters = ClusterGraph(pathfinding, size=8)
+        free = np.argwhere(level.grid == 0)
+        start, goal = tuple(free[0][::-1].tolist()), tuple(free[-1][::-1].tolist())
+        length = pathfinding.find_local_path(start, goal)[2]
+
+        pos, steps = start, 0
+        while pos != goal and steps < 4 * length:
+            next_pos = pathfinding.get_path(pos, goal)
+            self.assertEqual(max(abs(next_pos[0] - pos[0]), abs(next_pos[1] - pos[1])), 1)
+            pos, steps = next_pos, steps + 1
+        self.assertEqual(pos, goal)
+        self.assertGreater(len(pathfinding.clusters.edges), 1)
+
+        # выгрузка левой половины оставляет только кластеры справа, поиск строит рёбра заново
+        pathfinding.clusters.evict(0, 0, 24, 40)
+        self.assertTrue(pathfinding.clusters.edges)
+        self.assertTrue(all(key[0] >= 3 for key in pathfinding.clusters.edges))
+        pathfinding.paths.clear()
+        self.assertEqual(max(abs(a - b) for a, b in zip(pathfinding.get_path(start, goal), start)), 1)
+
+    def test_request_path(self):
+        self.mock_game.player.map_pos = (3, 0)
+        self.assertIsNone(self.pathfinding.request_path((0, 0), (3, 0)))
+        self.assertIsNone(self.pathfinding.request_path((0, 3), (0, 0)))
+
+        self.pathfinding.update()
+        self.assertEqual(self.pathfinding.requests, {})
+        self.assertEqual(self.pathfinding.request_path((0, 0), (3, 0)), (1, 0))
+        self.assertNotIn(((0, 3), (0, 0)), self.pathfinding.paths)
+
+    def test_update_cell_invalidates_paths(self):
+        self.pathfinding.map = np.array(self.mock_game.map.grid)
+        self.pathfinding.get_path((0, 0), (3, 0))
+        self.pathfinding.get_path((0, 1), (0, 3))
+
+        self.pathfinding.map[0, 2] = 1
+        self.pathfinding.update_cell(2, 0)
+        self.assertEqual(set(self.pathfinding.paths), {((0, 1), (0, 3))})
+
+        self.pathfinding.get_path((0, 0), (2, 2))
+        self.pathfinding.map[1, 1] = 0
+        self.pathfinding.update_cell(1, 1)
+        self.assertEqual(set(self.pathfinding.paths), {((0, 1), (0, 3))})
+        self.assertEqual(self.pathfinding.get_path((0, 0), (2, 2)), (1, 1))
+
 
 class TestPlayer(unittest.TestCase):
     def setUp(self):
@@ -231,17 +494,13 @@ class TestPlayer(unittest.TestCase):
         self.mock_game.delta_time = 1.0
         self.mock_game.screen = Mock()
 
-        self.patcher_time = patch('player.pg.time.get_ticks', return_value=1000)
-        self.mock_time = self.patcher_time.start()
+        self.mock_game.time = 1000
 
         self.player = Player(self.mock_game)
 
-    def tearDown(self):
-        self.patcher_time.stop()
-
     def test_recover_health(self):
         self.player.health = 5
-        self.mock_time.return_value = 2000
+        self.mock_game.time = 2000
         self.player.recover_health()
         self.assertEqual(self.player.health, 6)
 
@@ -251,17 +510,15 @@ class TestPlayer(unittest.TestCase):
         self.assertEqual(self.player.health, 10)
 
     def test_check_health_recovery_delay(self):
-        self.mock_time.return_value = 2000
+        self.mock_game.time = 2000
         result = self.player.check_health_recovery_delay()
         self.assertTrue(result)
 
-    @patch('player.pg.time.delay')
-    @patch('player.pg.display.flip')
-    def test_check_game_over(self, mock_display_flip, mock_time_delay):
+    def test_check_game_over(self):
+        self.mock_game.outcome = None
         self.player.health = 0
         self.player.check_game_over()
-        mock_display_flip.assert_called_once()
-        mock_time_delay.assert_called_once_with(1500)
+        self.assertEqual(self.mock_game.outcome, 'lose')
 
     def test_get_damage(self):
         self.player.health = 10
@@ -274,18 +531,19 @@ class TestPlayer(unittest.TestCase):
     def test_map_pos_property(self):
         self.assertEqual(self.player.map_pos, (int(self.player.x), int(self.player.y)))
 
-    @patch('player.pg.MOUSEBUTTONDOWN')
-    def test_single_fire_event(self, mock_event_type):
-        mock_event = Mock()
-        mock_event.type = pg.MOUSEBUTTONDOWN
-        mock_event.button = 1
+    def test_fire_frame(self):
+        keys = dict.fromkeys((pg.K_w, pg.K_s, pg.K_a, pg.K_d), False)
+        self.mock_game.controls.frame = InputFrame(keys, 0, fire=True)
         self.player.shot = False
-        self.mock_game.weapon.reloading = False
-
-        self.player.single_fire_event(mock_event)
+        self.player.mouse_control()
         self.assertTrue(self.player.shot)
         self.assertTrue(self.mock_game.weapon.reloading)
 
+        # выстрел уже обработан, но оружие ещё перезаряжается: второй кадр с выстрелом игнорируется
+        self.player.shot = False
+        self.player.mouse_control()
+        self.assertFalse(self.player.shot)
+
     @patch.object(Player, 'movement', return_value=None)
     @patch.object(Player, 'mouse_control', return_value=None)
     @patch.object(Player, 'recover_health', return_value=None)
@@ -295,18 +553,27 @@ class TestPlayer(unittest.TestCase):
         mock_mouse_control.assert_called_once()
         mock_recover_health.assert_called_once()
 
+    def test_camera_interpolate(self):
+        self.player.x, self.player.y, self.player.angle = 1.0, 2.0, math.tau - 0.1
+        self.player.save_state()
+        self.player.x, self.player.angle = 2.0, 0.1
+        camera = Camera(self.player)
+        camera.interpolate(self.player.prev_state, (self.player.x, self.player.y, self.player.angle), 0.5)
+
+        self.assertEqual(camera.pos, (1.5, 2.0))
+        self.assertAlmostEqual(camera.angle, 0.0)
+
 
 class TestRayCasting(unittest.TestCase):
     def setUp(self):
-        self.mock_game = Mock()
+        self.mock_game = make_fake_game([
+            [0, 0, 0, 0],
+            [0, 1, 0, 0],
+            [0, 0, 2, 0],
+            [0, 0, 0, 0]
+        ])
         self.mock_game.object_renderer.wall_textures = [Mock()] * 10  # имитация текстуры стен
-        self.mock_game.map.world_map = {
-            (1, 1): 1,
-            (2, 2): 2
-        }
-        self.mock_game.player.pos = (1.5, 1.5)
-        self.mock_game.player.map_pos = (1, 1)
-        self.mock_game.player.angle = 0
+        self.mock_game.object_renderer.wall_mips = [self.mock_game.object_renderer.wall_textures]
         self.ray_casting = RayCasting(self.mock_game)
 
     @patch('raycasting.pg.transform.scale', return_value=Mock())
@@ -329,6 +596,25 @@ class TestRayCasting(unittest.TestCase):
         for result in self.ray_casting.ray_casting_result:
             self.assertEqual(len(result), 4)
 
+    def test_cast_views(self):
+        grid = np.ones((6, 8), dtype=np.uint8)
+        grid[1:5, 1:7] = 0
+        grid[2, 4] = 3
+        self.mock_game.map.grid = grid
+        self.mock_game.map.world_map = {(x, y): int(grid[y, x]) for y, x in zip(*np.nonzero(grid))}
+        poses = [(1.5, 1.5, 0.3), (6.2, 3.7, 2.5), (2.5, 4.5, 5.0)]
+
+        # пакетный результат совпадает с покадровым ray_cast для каждой позы
+        depth, texture, offset = self.ray_casting.cast_views(poses)
+        self.assertEqual(depth.shape, (3, NUM_RAYS))
+        for i, (x, y, angle) in enumerate(poses):
+            self.mock_game.camera = Mock(pos=(x, y), map_pos=(int(x), int(y)), angle=angle)
+            self.ray_casting.ray_cast()
+            expected = np.array(self.ray_casting.ray_casting_result)
+            np.testing.assert_allclose(depth[i], expected[:, 0])
+            np.testing.assert_array_equal(texture[i], expected[:, 2])
+            np.testing.assert_allclose(offset[i], expected[:, 3], atol=1e-9)
+
     @patch.object(RayCasting, 'ray_cast', return_value=None)
     @patch.object(RayCasting, 'get_objects_to_render', return_value=None)
     def test_update(self, mock_get_objects_to_render, mock_ray_cast):
@@ -339,20 +625,12 @@ class TestRayCasting(unittest.TestCase):
 
 
 class TestWeapon(unittest.TestCase):
-    @classmethod
-    def setUpClass(cls):
-        pg.init()
-        pg.display.set_mode((800, 600))  # мок дисплей
-
-    @classmethod
-    def tearDownClass(cls):
-        pg.quit()
-
     def setUp(self):
         # мок объекта
         self.mock_game = Mock()
         self.mock_game.player = Mock()
         self.mock_game.screen = Mock()  # имитация blit
+        self.mock_game.entities = EntityStore()
 
         self.weapon = Weapon(self.mock_game, scale=0.5)
         self.weapon.images = deque([pg.Surface((50, 50)) for _ in range(3)])
@@ -381,31 +659,22 @@ class TestWeapon(unittest.TestCase):
             self.weapon.images[0], self.weapon.weapon_pos
         )
 
-    def test_update(self):
-        self.weapon.check_animation_time = Mock()
-        self.weapon.animate_shot = Mock()
-
+    @patch.object(Weapon, 'animate_shot')
+    @patch.object(Weapon, 'check_animation_time')
+    def test_update(self, mock_check_animation_time, mock_animate_shot):
         self.weapon.update()
 
-        self.weapon.check_animation_time.assert_called_once()
-        self.weapon.animate_shot.assert_called_once()
+        mock_check_animation_time.assert_called_once()
+        mock_animate_shot.assert_called_once()
 
 
 class TestSpriteObject(unittest.TestCase):
-    @classmethod
-    def setUpClass(cls):
-        pg.init()
-        pg.display.set_mode((800, 600))
-
-    @classmethod
-    def tearDownClass(cls):
-        pg.quit()
-
     def setUp(self):
         self.mock_game = Mock()
         self.mock_game.player = Mock()
         self.mock_game.screen = pg.Surface((800, 600))  # мок экран как pygame Surface
         self.mock_game.raycasting.objects_to_render = []
+        self.mock_game.entities = EntityStore()
 
         self.sprite = SpriteObject(self.mock_game, pos=(5, 5), scale=0.7)
 
@@ -433,23 +702,59 @@ class TestSpriteObject(unittest.TestCase):
         self.assertTrue(len(self.mock_game.raycasting.objects_to_render) > 0)
 
 
-class TestAnimatedSprite(unittest.TestCase):
-    @classmethod
-    def setUpClass(self):
-        # иниц pygame для предотвращения ошибок
-        pg.init()
-        pg.display.set_mode((800, 600))
+class TestEntityStore(unittest.TestCase):
+    def test_project_matches_get_sprite(self):
+        mock_game = Mock()
+        mock_game.player.x, mock_game.player.y, mock_game.player.angle = 5.5, 5.5, 4.0
+        mock_game.raycasting.objects_to_render = []
+        mock_game.entities = store = EntityStore(capacity=4)
+        rng = np.random.default_rng(0)
+        sprites = [SpriteObject(mock_game, pos=pos) for pos in rng.uniform(0, 12, size=(40, 2))]
+        self.assertEqual(store.size, 40)
+
+        store.project(mock_game.player)
+        projected = store.screen_x[:40].copy(), store.norm_dist[:40].copy(), store.visible[:40].copy()
+        [sprite.get_sprite() for sprite in sprites]
+
+        np.testing.assert_allclose(store.screen_x[:40], projected[0])
+        np.testing.assert_allclose(store.norm_dist[:40], projected[1])
+        self.assertEqual(len(mock_game.raycasting.objects_to_render), projected[2].sum())
+
+    def test_copy(self):
+        store = EntityStore(capacity=4)
+        for i in range(6):
+            store.add(Mock(), i, i, 0.5, 0.2, 10)
+        copy = store.copy()
+        store.x[:] = 0
+        copy.project(Mock(x=0, y=0, angle=0))
+
+        self.assertEqual(copy.size, 6)
+        self.assertEqual(copy.x[5], 5)
+        self.assertEqual(store.dist[5], 1)
+
+    def test_index(self):
+        store = EntityStore(capacity=8)
+        entities = [Mock() for i in range(6)]
+        for i, entity in enumerate(entities):
+            store.add(entity, i + 1, 0, 0.5, 0.2, 10)
+        store.project(Mock(x=0, y=0, angle=0), index=np.array([1, 4]))
+        np.testing.assert_array_equal(store.dist[:6], [1, 2, 1, 1, 5, 1])
+
+        copy = store.copy([4, 1])
+        self.assertEqual(copy.size, 2)
+        self.assertEqual(copy.entities, [entities[4], entities[1]])
+        np.testing.assert_array_equal(copy.x[:2], [5, 2])
 
-    @classmethod
-    def tearDownClass(self):
-        pg.quit()
 
+class TestAnimatedSprite(unittest.TestCase):
     def setUp(self):
         # мок объект игры
         self.mock_game = Mock()
         self.mock_game.player = Mock()
         self.mock_game.screen = pg.Surface((800, 600)) 
         self.mock_game.raycasting.objects_to_render = []
+        self.mock_game.entities = EntityStore()
+        self.mock_game.time = 1000
 
         self.animated_sprite = AnimatedSprite(self.mock_game, pos=(5, 5), scale=0.7, animation_time=100)
         self.animated_sprite.images = deque([pg.Surface((50, 50)) for _ in range(3)])  # иок изображения
@@ -464,13 +769,565 @@ class TestAnimatedSprite(unittest.TestCase):
 
     def test_check_animation_time(self):
         # проверка работы времени анимации
-        prev_time = pg.time.get_ticks()
-        self.animated_sprite.animation_time_prev = prev_time - 200
+        self.mock_game.time += 200
 
         self.animated_sprite.check_animation_time()
 
         self.assertTrue(self.animated_sprite.animation_trigger)
 
 
+class TestShading(unittest.TestCase):
+    def setUp(self):
+        self.mock_game = Mock()
+        self.mock_game.screen = pg.Surface(RES)
+        self.mock_game.player.x, self.mock_game.player.y, self.mock_game.player.angle = 1.5, 1.5, 0
+        self.mock_game.camera = self.mock_game.player
+        self.mock_game.object_handler.sprite_list = [
+            Mock(path='resources/sprites/animated_sprites/green_light', x=2.5, y=1.5),
+            Mock(path='resources/sprites/npc/soldier', x=3.5, y=1.5),
+        ]
+        near = [(1.0, SCREEN_DIST, 1, 0.5)] * (NUM_RAYS // 2)
+        far = [(20.0, SCREEN_DIST / 20, 1, 0.5)] * (NUM_RAYS // 2)
+        self.mock_game.raycasting.ray_casting_result = near + far
+        self.mock_game.raycasting.objects_to_render = []
+
+        self.shading = Shading(self.mock_game)
+
+    def test_get_lights(self):
+        self.assertEqual(len(self.shading.light_pos), 1)
+        self.assertEqual(tuple(self.shading.light_pos[0]), (2.5, 1.5))
+
+    def test_apply(self):
+        self.shading.light_pos = self.shading.light_pos[:0]
+        self.mock_game.screen.fill((200, 200, 200))
+
+        self.shading.apply()
+
+        near = self.mock_game.screen.get_at((0, HALF_HEIGHT))
+        far = self.mock_game.screen.get_at((RES[0] - 1, HALF_HEIGHT))
+        sky = self.mock_game.screen.get_at((RES[0] - 1, 0))
+        self.assertGreater(near.r, far.r)
+        self.assertEqual(sky, (200, 200, 200, 255))
+
+    def test_sprite_depth_mask(self):
+        # левая половина спрайта непрозрачна, правая - цветовой ключ: небо за ней остаётся без тени
+        image = pg.Surface((8 * SCALE, 8 * SHADING_ROW_STEP))
+        image.fill((255, 0, 0))
+        image.fill(SPRITE_COLORKEY, (4 * SCALE, 0, 4 * SCALE, 8 * SHADING_ROW_STEP))
+        image.set_colorkey(SPRITE_COLORKEY)
+        self.mock_game.raycasting.objects_to_render = [None] * NUM_RAYS + [(2.0, image, ((NUM_RAYS - 6) * SCALE, 0))]
+
+        depth_buffer, depth = self.shading.get_depth_buffer()
+        self.assertTrue((depth_buffer[-6:-2, :8] == 2.0).all())
+        self.assertTrue(np.isinf(depth_buffer[-2:, :8]).all())
+
+
+class TestTextureAtlas(unittest.TestCase):
+    def test_pack(self):
+        images = {1: pg.Surface((10, 20)), 2: pg.Surface((30, 5))}
+        images[2].fill((10, 20, 30))
+        atlas = TextureAtlas(images)
+
+        self.assertEqual(atlas.surface.get_size(), (40, 20))
+        self.assertFalse(atlas.rects[1].colliderect(atlas.rects[2]))
+        self.assertEqual(atlas.get(2).get_size(), (30, 5))
+        self.assertEqual(atlas.get(2).get_at((0, 0)), (10, 20, 30, 255))
+        self.assertIsNone(atlas.surface.get_colorkey())
+
+    def test_from_alpha(self):
+        image = pg.Surface((4, 4), pg.SRCALPHA)
+        image.fill((0, 0, 0, 0))
+        image.fill((*SPRITE_COLORKEY, 255), (0, 0, 2, 4))
+        atlas = TextureAtlas.from_alpha({'frame': image})
+        frame = atlas.get('frame')
+
+        self.assertEqual(frame.get_colorkey()[:3], SPRITE_COLORKEY)
+        self.assertEqual(frame.get_at((3, 0))[:3], SPRITE_COLORKEY)
+        self.assertNotEqual(frame.get_at((0, 0))[:3], SPRITE_COLORKEY)
+
+    def test_rle_frames(self):
+        # кадры RLE-атласа - отдельные поверхности с RLE, у подповерхностей его нет
+        image = pg.Surface((8, 8))
+        image.fill(SPRITE_COLORKEY)
+        image.fill((200, 0, 0), (2, 2, 4, 4))
+        atlas = TextureAtlas({'a': image, 'b': image}, SPRITE_COLORKEY, rle=True)
+
+        frame = atlas.frames[0]
+        self.assertTrue(frame.get_flags() & pg.RLEACCELOK)
+        self.assertIsNone(frame.get_parent())
+        self.assertFalse(atlas.get('a').get_flags() & pg.RLEACCELOK)
+        self.assertFalse(TextureAtlas({'a': image}, SPRITE_COLORKEY).frames[0].get_flags() & pg.RLEACCELOK)
+
+
+class TestAssetCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = AssetCache(os.path.join(self.temp_dir.name, 'assets.cache'))
+
+    def tearDown(self):
+        self.cache.close()
+        self.temp_dir.cleanup()
+
+    def bake_manifest(self):
+        self.cache.texture('resources/textures/digits/1.png', (30, 30))
+        self.cache.frames('resources/sprites/animated_sprites/green_light')
+
+    def test_bake_and_load(self):
+        with patch.object(self.cache, 'bake_manifest', self.bake_manifest):
+            self.cache.prepare()
+        expected = pg.transform.scale(pg.image.load('resources/textures/digits/1.png').convert_alpha(), (30, 30))
+
+        with patch('asset_cache.pg.image.load') as mock_load:
+            texture = self.cache.texture('resources/textures/digits/1.png', (30, 30))
+            frames = self.cache.frames('resources/sprites/animated_sprites/green_light')
+            mock_load.assert_not_called()
+
+        self.assertEqual(texture.get_at((15, 15)), expected.get_at((15, 15)))
+        self.assertEqual([path.rsplit('/', 1)[1] for path in frames], ['0.png', '1.png', '3.png', '4.png'])
+
+    def test_corrupt_cache(self):
+        # обрезанный файл и файл из одного заголовка пересобираются, а не роняют запуск
+        with patch.object(self.cache, 'bake_manifest', self.bake_manifest):
+            self.cache.prepare()
+        self.cache.close()
+        size = os.path.getsize(self.cache.path)
+        for length in (4, size - 1):
+            with open(self.cache.path, 'r+b') as file:
+                file.truncate(length)
+            self.assertFalse(self.cache.load())
+            with patch.object(self.cache, 'bake_manifest', self.bake_manifest):
+                self.cache.prepare()
+            self.assertEqual(os.path.getsize(self.cache.path), size)
+            self.cache.close()
+
+    def test_settings_invalidate(self):
+        with patch.object(self.cache, 'bake_manifest', self.bake_manifest):
+            self.cache.prepare()
+        self.cache.close()
+        for name, value in (('ALPHA_THRESHOLD', 1), ('SPRITE_COLORKEY', (0, 255, 0)), ('WEAPON_SCALE', 1)):
+            with patch(f'asset_cache.{name}', value):
+                self.assertFalse(self.cache.load())
+        self.assertTrue(self.cache.load())
+
+    def test_is_stale(self):
+        stat = os.stat('resources/textures/sky.png')
+        self.assertFalse(self.cache.is_stale({'resources/textures/sky.png': [stat.st_mtime_ns, stat.st_size]}))
+        self.assertTrue(self.cache.is_stale({'resources/textures/sky.png': [stat.st_mtime_ns + 1, stat.st_size]}))
+        self.assertTrue(self.cache.is_stale({'resources/textures/missing.png': [0, 0]}))
+
+    def test_frame_order(self):
+        names = ['10.png', '2.png', 'POSSN0.png', '1.png', 'POSSM0.png']
+        self.assertEqual(sorted(names, key=AssetCache.frame_order),
+                         ['1.png', '2.png', '10.png', 'POSSM0.png', 'POSSN0.png'])
+
+
+class TestLevel(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'test.lvl')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_save_load(self):
+        level = Level([[1, 1, 1], [1, 0, 2], [1, 1, 1]], sprites=[(0, 1.5, 1.5)], npcs=[(2, 1.25, 1.75)],
+                      player_pos=(1.5, 1.5))
+        level.save(self.path)
+        loaded = Level.load(self.path)
+
+        np.testing.assert_array_equal(loaded.grid, level.grid)
+        self.assertEqual(loaded.sprites.tolist(), [(0, 1.5, 1.5)])
+        self.assertEqual(loaded.npcs.tolist(), [(2, 1.25, 1.75)])
+        self.assertEqual(loaded.player_pos, (1.5, 1.5))
+
+    def test_load_invalid(self):
+        with open(self.path, 'wb') as file:
+            file.write(bytes(64))
+        with self.assertRaises(ValueError):
+            Level.load(self.path)
+
+    def test_generate_level(self):
+        level = generate_level(64, 48, seed=1)
+        player_x, player_y = map(int, level.player_pos)
+
+        self.assertEqual((level.cols, level.rows), (64, 48))
+        self.assertTrue(level.grid[[0, -1], :].all() and level.grid[:, [0, -1]].all())
+        self.assertEqual(level.grid[player_y, player_x], 0)
+        self.assertGreater(len(level.npcs), 0)
+        self.assertFalse(level.grid[level.npcs['y'].astype(int), level.npcs['x'].astype(int)].any())
+
+
+class TestChunkedWorld(unittest.TestCase):
+    def setUp(self):
+        self.mock_game = Mock()
+        self.mock_game.player.pos = (1.5, 1.5)
+        self.grid = np.zeros((40, 100), dtype=np.uint8)
+        self.world = ChunkedWorld(self.mock_game, self.grid, chunk_size=10)
+        self.mock_game.map.world = self.world
+        self.mock_game.map.grid = self.grid
+
+    def test_chunks(self):
+        self.assertEqual(len(self.world.chunks), 40)
+        self.assertEqual(self.world.get_chunk(25.5, 31.2).bounds, (20, 30, 30, 40))
+        self.assertIsNone(self.world.get_chunk(100, 0))
+
+    def test_active_region(self):
+        self.world.update()
+        self.assertEqual({chunk.key for chunk in self.world.active}, {(x, y) for x in range(3) for y in range(3)})
+
+    def test_move_npc(self):
+        npc = Mock(x=5.5, y=5.5)
+        self.world.add_npc(npc)
+        npc.x = 15.5
+        self.world.move_npc(npc)
+
+        self.assertIs(npc.chunk, self.world.get_chunk(15.5, 5.5))
+        self.assertEqual(self.world.get_chunk(5.5, 5.5).npcs, [])
+
+    def test_page_out(self):
+        npc = Mock(x=5.5, y=5.5, alive=True)
+        self.world.add_npc(npc)
+        self.world.update()
+        self.assertIn(npc.chunk, self.world.paged)
+
+        self.mock_game.player.pos = (95.5, 35.5)
+        self.world.update()
+
+        npc.animations.evict.assert_called_once_with(keep=('idle', 'walk'))
+        self.mock_game.pathfinding.clusters.evict.assert_any_call(0, 0, 10, 10)
+        self.assertNotIn(npc.chunk, self.world.paged)
+
+    def test_active_index(self):
+        near, far = Mock(x=5.5, y=5.5, index=3), Mock(x=95.5, y=35.5, index=7)
+        self.world.add_npc(near)
+        self.world.add_npc(far)
+        self.world.update()
+        np.testing.assert_array_equal(self.world.active_index, [3])
+
+
+class TestMinimap(unittest.TestCase):
+    def setUp(self):
+        self.mock_game = Mock()
+        self.mock_game.screen = pg.display.get_surface()
+        self.mock_game.map.grid = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]])
+        self.mock_game.camera = Camera(Mock(x=1.5, y=1.5, angle=0))
+        self.mock_game.raycasting.ray_casting_result = [(2, 0, 1, 0)] * NUM_RAYS
+        self.mock_game.snapshot.sprites = []
+        self.minimap = Minimap(self.mock_game, scale=4, size=40)
+
+    def test_update_cell(self):
+        pos = self.minimap.pad + 4 + 1, self.minimap.pad + 4 + 1
+        floor = self.minimap.surface.get_at(pos)
+        self.mock_game.map.grid[1, 1] = 1
+        self.minimap.update_cell(1, 1)
+        self.assertNotEqual(self.minimap.surface.get_at(pos), floor)
+
+    def test_draw(self):
+        screen, rect = self.mock_game.screen, self.minimap.rect
+        self.minimap.draw()
+        self.assertEqual(screen.get_at(rect.center), (0, 0, 0, 255))
+
+        # окно центрировано на игроке: игрок в центре, стены карты по краям
+        self.minimap.visible = True
+        self.minimap.draw()
+        self.assertEqual(screen.get_at(rect.center), pg.Color('green'))
+        self.assertEqual(screen.get_at((rect.x + 2, rect.y + 2)), (90, 90, 90, 255))
+
+
+class TestHud(unittest.TestCase):
+    def setUp(self):
+        self.mock_game = Mock()
+        self.mock_game.screen = pg.display.get_surface()
+        self.mock_game.object_renderer.digit_size = 20
+        self.mock_game.object_renderer.digits = {str(i): pg.Surface((20, 20)) for i in range(11)}
+        self.mock_game.weapon.weapon_pos = (300, 400)
+        self.mock_game.snapshot = Mock(health=100, weapon=pg.Surface((50, 50)))
+        self.hud = Hud(self.mock_game)
+
+    def test_update(self):
+        self.hud.update(self.mock_game.snapshot)
+        image = self.hud.health_image
+        self.assertEqual(image.get_size(), (80, 20))
+
+        # без смены здоровья композит не перерисовывается
+        self.hud.update(self.mock_game.snapshot)
+        self.assertIs(self.hud.health_image, image)
+
+        self.mock_game.snapshot.health = 7
+        self.hud.update(self.mock_game.snapshot)
+        self.assertEqual(self.hud.health_image.get_size(), (40, 20))
+
+        self.mock_game.snapshot.health = -5
+        self.hud.update(self.mock_game.snapshot)
+        self.assertEqual(self.hud.health, 0)
+
+    def test_draw(self):
+        self.hud.draw()
+        self.assertEqual(self.hud.layers, [(self.hud.health_image, (0, 0)),
+                                           (self.mock_game.snapshot.weapon, (300, 400))])
+
+
+class TestCollision(unittest.TestCase):
+    def setUp(self):
+        self.grid = np.zeros((8, 8), dtype=np.uint8)
+        self.grid[:, 5] = 1
+
+    def test_move_circle(self):
+        # быстрый шаг не проходит сквозь стену, а упирается в неё краем круга
+        x, y = move_circle(self.grid, 1.5, 1.5, 10, 0, 0.25)
+        self.assertAlmostEqual(x, 4.75, places=5)
+        self.assertEqual(y, 1.5)
+
+        # у стены круг скользит вдоль неё
+        x, y = move_circle(self.grid, 4.7, 1.5, 0.5, 0.5, 0.25)
+        self.assertAlmostEqual(x, 4.75, places=5)
+        self.assertEqual(y, 2)
+
+        self.assertEqual(move_circle(self.grid, 6.5, 1.5, 0.2, -0.3, 0.25), (6.7, 1.2))
+
+    def test_lead_in_wall(self):
+        # край уже в стене (игрок в углу клетки у стены слева): шаг назад не проходит сквозь неё
+        level = Level.from_mini_map(mini_map)
+        self.assertEqual(level.grid[5, 1], 1)
+        x, y = move_circle(level.grid, 2.0, 5.0, -0.5, 0, PLAYER_SIZE)
+        self.assertGreaterEqual(x - PLAYER_SIZE, 2)
+        x = move_circles(level.grid, np.array([2.0]), np.array([5.0]), np.array([-0.5]), np.array([0.0]),
+                         np.array([PLAYER_SIZE]))[0][0]
+        self.assertGreaterEqual(x - PLAYER_SIZE, 2)
+        # край ровно на границе стены
+        self.assertAlmostEqual(move_circle(self.grid, 4.75, 1.5, 0.5, 0, 0.25)[0], 4.75, places=5)
+
+        game = make_game()
+        self.assertEqual(game.player.pos, (2.5, 5.5))
+        self.assertEqual(game.map.grid[5, 2], 0)
+        for _ in range(200):
+            game.tick(InputFrame({pg.K_w: False, pg.K_s: True, pg.K_a: False, pg.K_d: False}, 0))
+        self.assertGreaterEqual(game.player.x - PLAYER_SIZE, 2)
+
+    def test_move_circles(self):
+        rng = np.random.default_rng(0)
+        x, y = rng.uniform(1, 4, 50), rng.uniform(1, 7, 50)
+        dx, dy = rng.normal(0, 3, 50), rng.normal(0, 3, 50)
+        radius = rng.uniform(0.1, 0.4, 50)
+        batch = move_circles(self.grid, x, y, dx, dy, radius)
+        for i in range(50):
+            np.testing.assert_allclose([batch[0][i], batch[1][i]],
+                                       move_circle(self.grid, x[i], y[i], dx[i], dy[i], radius[i]))
+
+
+class TestControls(unittest.TestCase):
+    def test_input_frame(self):
+        frame = InputFrame({pg.K_w: True, pg.K_s: False, pg.K_a: False, pg.K_d: True}, -12, True)
+        decoded = InputFrame.decode(*frame.encode())
+        self.assertEqual(decoded.keys, frame.keys)
+        self.assertEqual((decoded.rel, decoded.fire), (-12, True))
+
+    def test_record_replay(self):
+        controls = Controls(seed=42)
+        controls.recording = [InputFrame({pg.K_w: True, pg.K_s: False, pg.K_a: False, pg.K_d: False}, 5).encode(),
+                              InputFrame(dict.fromkeys((pg.K_w, pg.K_s, pg.K_a, pg.K_d), False), 0, True).encode()]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'session.rep')
+            controls.save(path)
+            self.assertEqual(os.path.getsize(path), 18 + 2 * 2)
+            replay = Replay.load(path)
+
+        self.assertEqual(replay.seed, 42)
+        frame = replay.poll()
+        self.assertTrue(frame.keys[pg.K_w])
+        self.assertEqual(frame.rel, 5)
+        self.assertTrue(replay.poll().fire)
+        self.assertFalse(replay.finished)
+        replay.poll()
+        self.assertTrue(replay.finished)
+
+
+class TestFrameExporter(unittest.TestCase):
+    def setUp(self):
+        self.surface = pg.Surface((8, 6))
+        self.surface.fill('red')
+
+    def test_png(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            exporter = FrameExporter(tmp, 'png')
+            for _ in range(3):
+                exporter.submit(self.surface)
+            exporter.close()
+
+            self.assertEqual(sorted(os.listdir(tmp)), [f'frame_{i:06d}.png' for i in range(3)])
+            image = pg.image.load(os.path.join(tmp, 'frame_000002.png'))
+            self.assertEqual(image.get_at((0, 0)), pg.Color('red'))
+
+    def test_raw(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            exporter = FrameExporter(tmp, 'raw')
+            exporter.submit(self.surface)
+            exporter.submit(self.surface)
+            exporter.close()
+            self.assertEqual(os.path.getsize(os.path.join(tmp, 'frames.rgb')), 2 * 8 * 6 * 3)
+
+    def test_full_queue_drops_frames(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            exporter = FrameExporter(tmp, 'raw', max_queue=1)
+            # поток записи остановлен, очередь заполнена: кадр пропускается, а не ждёт
+            exporter.queue.put(None)
+            exporter.thread.join()
+            exporter.queue.put(None)
+            exporter.submit(self.surface)
+            self.assertEqual(exporter.dropped, 1)
+            exporter.stream.close()
+
+
+class TestWorldServer(unittest.TestCase):
+    def setUp(self):
+        self.level = Level.from_mini_map([[1, 1, 1, 1, 1, 1],
+                                          [1, 0, 0, 0, 0, 1],
+                                          [1, 0, 0, 0, 0, 1],
+                                          [1, 1, 1, 1, 1, 1]], player_pos=(1.5, 1.5))
+        self.level.npcs = np.zeros(1, dtype=self.level.npcs.dtype)
+        self.level.npcs['x'], self.level.npcs['y'] = 4.5, 2.5
+        self.grid = SharedGrid(self.level.grid)
+
+    def tearDown(self):
+        self.grid.close()
+        self.grid.memory.unlink()
+
+    def test_shared_grid(self):
+        attached = pickle.loads(pickle.dumps(self.grid))
+        np.testing.assert_array_equal(attached.array, self.level.grid)
+        self.assertFalse(attached.array.flags.writeable)
+        attached.close()
+
+    def test_world_step(self):
+        world = World(self.level, self.grid, seed=0)
+        self.assertIs(world.game.map.grid.base, self.grid.array.base)
+
+        # вперёд (W) два тика: игрок смещается по x, наблюдение отражает тик и позу
+        world.step((1, 0))
+        world.step((1, 0))
+        observation = world.observe(view=True)
+        self.assertEqual(observation['tick'], 2)
+        self.assertGreater(observation['pose'][0], 1.5)
+        self.assertEqual(observation['npcs'], 1)
+        self.assertEqual(observation['view'].shape, (VIEW_SIZE[1], VIEW_SIZE[0], 3))
+
+    def test_world_episode(self):
+        world = World(self.level, self.grid, seed=0)
+        world.step()
+        health = world.game.player.health
+        world.game.player.get_damage(health)
+        observation = world.observe()
+        self.assertTrue(observation['done'])
+        self.assertEqual(observation['outcome'], 'lose')
+
+        world.step()
+        observation = world.observe()
+        self.assertFalse(observation['done'])
+        self.assertEqual((observation['episode'], observation['health']), (1, health))
+
+    def test_worlds_own_random(self):
+        # у каждого мира свой генератор: соседи по процессу не меняют исход, reset начинает с того же seed
+        def trace(*seeds, ticks=600):
+            worlds = [World(self.level, self.grid, seed) for seed in seeds]
+            health = []
+            for _ in range(ticks):
+                [world.step() for world in worlds]
+                health.append(tuple(world.game.player.health for world in worlds))
+            return list(zip(*health)), worlds[0]
+
+        (alone,), first = trace(0)
+        self.assertLess(min(alone), 100)
+        self.assertEqual(trace(0, 0)[0], [alone, alone])
+        self.assertEqual(trace(0, 1)[0][0], alone)
+
+        state = World(self.level, self.grid, seed=0).game.random.getstate()
+        first.reset()
+        self.assertEqual(first.game.random.getstate(), state)
+
+    def test_worlds_share_surfaces(self):
+        first, second = World(self.level, self.grid, seed=0), World(self.level, self.grid, seed=1)
+        renderer = first.game.object_renderer
+        self.assertIs(renderer.sky_image, second.game.object_renderer.sky_image)
+        self.assertIs(renderer.win_image, second.game.object_renderer.win_image)
+        self.assertNotIn('background', vars(renderer))
+        self.assertNotIn('shade_frame', vars(first.game.shading))
+
+    def test_server(self):
+        server = WorldServer([self.level] * 2, seeds=[0, 1], workers=1)
+        try:
+            observations = server.step({1: (0, 10)})
+            self.assertEqual([observation['tick'] for observation in observations], [1, 1])
+            self.assertEqual(observations[0]['pose'][2], 0)
+            self.assertGreater(observations[1]['pose'][2], 0)
+            self.assertGreater(server.run(5), 0)
+        finally:
+            server.close()
+
+    def run_cold(self, script):
+        # отдельный процесс без окна и с пустым кэшем ресурсов, как у свежего клона
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = os.path.join(tmp, 'assets.cache')
+            result = subprocess.run([sys.executable, '-c', script, cache_path], capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)), timeout=300)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertTrue(os.path.getsize(cache_path))
+            return result.stdout
+
+    def test_server_cold_cache(self):
+        # исполнитель сам собирает кэш: канал сразу закрывается, serve возвращается после подготовки
+        self.run_cold('import sys\n'
+                      'from server import *\n'
+                      'parent, child = mp.Pipe()\n'
+                      'parent.send(None)\n'
+                      'serve(child, {}, sys.argv[1])\n')
+        output = self.run_cold('import sys\n'
+                               'from server import *\n'
+                               'assets.path = sys.argv[1]\n'
+                               'server = WorldServer([Level.from_mini_map(mini_map, mini_map_sprites)], [0])\n'
+                               'print(server.step()[0][\'tick\'])\n'
+                               'server.close()\n')
+        self.assertEqual(output.split()[-1], '1')
+
+
+@benchmark
+class TestBenchmark(unittest.TestCase):
+    # сравниваются только пакетные пути с поштучными на той же машине, без абсолютных порогов
+    def setUp(self):
+        self.game = make_game()
+
+    def measure(self, function, repeat=5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        return (time.perf_counter() - start) / repeat
+
+    def test_cast_views(self):
+        raycasting, camera = self.game.raycasting, self.game.camera
+        poses = [(camera.x, camera.y, camera.angle + 0.1 * i) for i in range(8)]
+        batched = self.measure(lambda: raycasting.cast_views(poses))
+
+        def scalar():
+            for camera.x, camera.y, camera.angle in poses:
+                raycasting.ray_cast()
+        self.assertLess(batched, self.measure(scalar))
+
+    def test_slots(self):
+        # слоты против той же иерархии на __dict__: памяти на NPC меньше
+        dict_npc = get_dict_class(SoldierNPC)
+        self.assertTrue(hasattr(dict_npc(self.game, pos=(1.5, 1.5)), '__dict__'))
+        slots_memory = measure_memory(self.game, 200)[1]
+        self.assertLess(slots_memory, measure_memory(make_game(), 200, dict_npc)[1])
+
+    def test_move_circles(self):
+        grid = self.game.map.grid
+        rng = np.random.default_rng(0)
+        floor = np.argwhere(grid == 0)[rng.integers(len(np.argwhere(grid == 0)), size=500)]
+        y, x = floor.T + 0.5
+        dx, dy = rng.uniform(-0.1, 0.1, (2, len(x)))
+        batched = self.measure(lambda: move_circles(grid, x, y, dx, dy, 0.3))
+        scalar = self.measure(lambda: [move_circle(grid, *args, 0.3) for args in zip(x, y, dx, dy)])
+        self.assertLess(batched, scalar)
+
+
 if __name__ == "__main__":
     unittest.main()
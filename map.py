@@ -1,4 +1,7 @@
 import pygame as pg
+import numpy as np
+from level import *
+from chunks import *
 
 _ = False
 mini_map = [
@@ -36,21 +39,59 @@ mini_map = [
     [3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3],
 ]
 
+mini_map_sprites = [
+    ('animated_sprites/green_light/0.png', 11.5, 3.5),
+    ('animated_sprites/green_light/0.png', 1.5, 1.5),
+    ('animated_sprites/green_light/0.png', 1.5, 7.5),
+    ('animated_sprites/green_light/0.png', 5.5, 3.25),
+    ('animated_sprites/green_light/0.png', 5.5, 4.75),
+    ('animated_sprites/green_light/0.png', 7.5, 2.5),
+    ('animated_sprites/green_light/0.png', 7.5, 5.5),
+    ('animated_sprites/green_light/0.png', 14.5, 1.5),
+    ('animated_sprites/green_light/0.png', 14.5, 4.5),
+    ('animated_sprites/red_light/0.png', 14.5, 5.5),
+    ('animated_sprites/red_light/0.png', 14.5, 7.5),
+    ('animated_sprites/red_light/0.png', 12.5, 7.5),
+    ('animated_sprites/red_light/0.png', 9.5, 7.5),
+    ('animated_sprites/red_light/0.png', 14.5, 12.5),
+    ('animated_sprites/red_light/0.png', 9.5, 20.5),
+    ('animated_sprites/red_light/0.png', 10.5, 20.5),
+    ('animated_sprites/red_light/0.png', 3.5, 14.5),
+    ('animated_sprites/red_light/0.png', 3.5, 18.5),
+    ('animated_sprites/green_light/0.png', 14.5, 24.5),
+    ('animated_sprites/green_light/0.png', 14.5, 30.5),
+    ('animated_sprites/green_light/0.png', 1.5, 30.5),
+    ('animated_sprites/green_light/0.png', 1.5, 24.5),
+]
+
 
 class Map:
-    def __init__(self, game):
+    def __init__(self, game, level=None):
         self.game = game
-        self.mini_map = mini_map
+        self.level = level or Level.from_mini_map(mini_map, mini_map_sprites)
+        # set_cell меняет свою копию сетки, уровень остаётся нетронутым для следующего new_game;
+        # сетка только для чтения (общая память сервера миров) используется как есть
+        self.grid = np.array(self.level.grid) if self.level.grid.flags.writeable else self.level.grid
+        self.mini_map = self.grid
         self.world_map = {}
-        self.rows = len(self.mini_map)
-        self.cols = len(self.mini_map[0])
+        self.rows = self.level.rows
+        self.cols = self.level.cols
         self.get_map()
+        self.world = ChunkedWorld(game, self.grid)
 
     def get_map(self):
-        for j, row in enumerate(self.mini_map):
-            for i, value in enumerate(row):
-                if value:
-                    self.world_map[(i, j)] = value
+        ys, xs = np.nonzero(self.grid)
+        self.world_map = dict(zip(zip(xs.tolist(), ys.tolist()), self.grid[ys, xs].tolist()))
+
+    def set_cell(self, x, y, value):
+        # стена (value > 0) или проход (0): обновляются карта, рейкастинг и граф путей
+        self.grid[y, x] = value
+        if value:
+            self.world_map[(x, y)] = int(value)
+        else:
+            self.world_map.pop((x, y), None)
+        self.game.pathfinding.update_cell(x, y)
+        self.game.minimap.update_cell(x, y)
 
     def draw(self):
         [pg.draw.rect(self.game.screen, 'darkgray', (pos[0] * 100, pos[1] * 100, 100, 100), 2)
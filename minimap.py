@@ -0,0 +1,73 @@
+import pygame as pg
+import numpy as np
+from functools import cached_property
+from settings import *
+from npc import NPC
+
+
+class Minimap:
+    # статичная сетка рисуется один раз в кэш, поверх окна вокруг игрока - игрок, NPC и лучи
+    def __init__(self, game, scale=MINIMAP_SCALE, size=MINIMAP_SIZE):
+        self.game = game
+        self.scale = scale
+        self.size = size
+        self.pad = size // 2
+        self.rect = pg.Rect(*MINIMAP_POS, size, size)
+        self.visible = MINIMAP
+
+    @cached_property
+    def surface(self):
+        # кэш сетки строится при первой отрисовке, мирам без окна он не нужен
+        return self.get_surface()
+
+    def get_surface(self):
+        grid = self.game.map.grid
+        rows, cols = grid.shape
+        colors = np.where(grid.T[..., None] > 0, MINIMAP_WALL_COLOR, MINIMAP_FLOOR_COLOR).astype(np.uint8)
+        cells = pg.transform.scale(pg.surfarray.make_surface(colors), (cols * self.scale, rows * self.scale))
+
+        surface = pg.Surface((cols * self.scale + self.size, rows * self.scale + self.size))
+        surface.fill(MINIMAP_WALL_COLOR)
+        surface.blit(cells, (self.pad, self.pad))
+        return surface
+
+    def update_cell(self, x, y):
+        if 'surface' not in self.__dict__:
+            return
+        color = MINIMAP_WALL_COLOR if self.game.map.grid[y, x] else MINIMAP_FLOOR_COLOR
+        self.surface.fill(color, (self.pad + x * self.scale, self.pad + y * self.scale, self.scale, self.scale))
+
+    def toggle_event(self, event):
+        if event.type == pg.KEYDOWN and event.key == pg.K_TAB:
+            self.visible = not self.visible
+
+    def draw(self):
+        if not self.visible:
+            return
+        screen, camera, scale = self.game.screen, self.game.camera, self.scale
+        left, top = camera.x * scale - self.pad, camera.y * scale - self.pad
+        screen.blit(self.surface, self.rect, (self.pad + left, self.pad + top, self.size, self.size))
+
+        # мировые координаты -> экран внутри окна миникарты
+        ox, oy = self.rect.x - left, self.rect.y - top
+        screen.set_clip(self.rect)
+        player_pos = ox + camera.x * scale, oy + camera.y * scale
+        pg.draw.polygon(screen, MINIMAP_RAY_COLOR, [player_pos, *self.get_ray_points(ox, oy)], 1)
+
+        store = self.game.snapshot.entities
+        for row, (sprite, image) in enumerate(self.game.snapshot.sprites):
+            if isinstance(sprite, NPC) and sprite.alive:
+                pg.draw.circle(screen, 'red', (ox + store.x[row] * scale, oy + store.y[row] * scale), 3)
+        pg.draw.circle(screen, 'green', player_pos, 4)
+        screen.set_clip(None)
+        pg.draw.rect(screen, 'darkgray', self.rect, 1)
+
+    def get_ray_points(self, ox, oy):
+        # граница поля зрения по каждому MINIMAP_RAY_STEP лучу; глубина хранится без коррекции рыбьего глаза
+        camera = self.game.camera
+        depth = np.array([result[0] for result in self.game.raycasting.ray_casting_result[::MINIMAP_RAY_STEP]])
+        offsets = (np.arange(len(depth)) * MINIMAP_RAY_STEP - HALF_NUM_RAYS) * DELTA_ANGLE
+        dist = depth / np.cos(offsets) * self.scale
+        xs = ox + camera.x * self.scale + dist * np.cos(camera.angle + offsets)
+        ys = oy + camera.y * self.scale + dist * np.sin(camera.angle + offsets)
+        return np.column_stack([xs, ys]).tolist()
@@ -1,20 +1,19 @@
 from sprite_object import *
-from random import randint, random
+from collision import *
 
 
 class NPC(AnimatedSprite):
+    __slots__ = ('animations', 'attack_dist', 'speed', 'size', 'health', 'attack_damage', 'accuracy', 'alive',
+                 'pain', 'ray_cast_value', 'frame_counter', 'player_search_trigger', 'next_pos', 'chunk')
+
     def __init__(self, game, path='resources/sprites/npc/soldier/0.png', pos=(10.5, 5.5),
                  scale=0.6, shift=0.38, animation_time=180):
         super().__init__(game, path, pos, scale, shift, animation_time)
-        self.attack_images = self.get_images(self.path + '/attack')
-        self.death_images = self.get_images(self.path + '/death')
-        self.idle_images = self.get_images(self.path + '/idle')
-        self.pain_images = self.get_images(self.path + '/pain')
-        self.walk_images = self.get_images(self.path + '/walk')
+        self.animations = AnimationSet(self.path, NPC_ANIMATIONS)
 
-        self.attack_dist = randint(3, 6)
+        self.attack_dist = game.random.randint(3, 6)
         self.speed = 0.03
-        self.size = 20
+        self.size = 0.3  # радиус тела в клетках
         self.health = 100
         self.attack_damage = 10
         self.accuracy = 0.15
@@ -23,6 +22,7 @@ class NPC(AnimatedSprite):
         self.ray_cast_value = False
         self.frame_counter = 0
         self.player_search_trigger = False
+        self.next_pos = None
 
         # self.xp_modifier =
         # self.xp_valueSoldier =
@@ -31,33 +31,79 @@ class NPC(AnimatedSprite):
 
     def update(self):
         self.check_animation_time()
-        self.get_sprite()
         self.run_logic()
         # self.draw_ray_cast()
 
-    def check_wall(self, x, y):
-        return (x, y) not in self.game.map.world_map
+    @property
+    def attack_images(self):
+        return self.animations['attack']
+
+    @property
+    def death_images(self):
+        return self.animations['death']
+
+    @property
+    def idle_images(self):
+        return self.animations['idle']
+
+    @property
+    def pain_images(self):
+        return self.animations['pain']
 
+    @property
+    def walk_images(self):
+        return self.animations['walk']
+
+    def stream_animations(self):
+        # ближние NPC подгружают все анимации в фоне, дальние освобождают неиспользуемые
+        dist = self.store.dist.item(self.index)
+        if dist < ANIMATION_PRELOAD_DIST:
+            self.animations.preload()
+            return self.animations.paths.values()
+        if dist > ANIMATION_EVICT_DIST:
+            self.animations.evict(keep=('idle', 'walk') if self.alive else ('death',))
+        return self.animations.loaded_paths
+
+    # в горячих методах позиция читается из массивов хранилища один раз и как float:
+    # свойства entity_field на каждое обращение дороже и возвращают numpy.float64
     def check_wall_collision(self, dx, dy):
-        if self.check_wall(int(self.x + dx * self.size), int(self.y)):
-            self.x += dx
-        if self.check_wall(int(self.x), int(self.y + dy * self.size)):
-            self.y += dy
+        store, index = self.store, self.index
+        store.x[index], store.y[index] = move_circle(self.game.map.grid, store.x.item(index), store.y.item(index),
+                                                     dx, dy, self.size)
 
     def movement(self):
-        next_pos = self.game.pathfinding.get_path(self.map_pos, self.game.player.map_pos)
-        next_x, next_y = next_pos
+        store, index = self.store, self.index
+        x, y = store.x.item(index), store.y.item(index)
+        next_pos = self.game.pathfinding.request_path((int(x), int(y)), self.game.player.map_pos) or self.next_pos
+        if next_pos is None:
+            return
+        self.next_pos = next_x, next_y = next_pos
 
         # pg.draw.rect(self.game.screen, 'blue', (100 * next_x, 100 * next_y, 100, 100))
-        if next_pos not in self.game.object_handler.npc_positions:
-            angle = math.atan2(next_y + 0.5 - self.y, next_x + 0.5 - self.x)
-            dx = math.cos(angle) * self.speed
-            dy = math.sin(angle) * self.speed
-            self.check_wall_collision(dx, dy)
+        angle = math.atan2(next_y + 0.5 - y, next_x + 0.5 - x)
+        push_x, push_y = self.get_separation(x, y)
+        dx = (math.cos(angle) + push_x * NPC_SEPARATION_WEIGHT) * self.speed
+        dy = (math.sin(angle) + push_y * NPC_SEPARATION_WEIGHT) * self.speed
+        self.game.object_handler.queue_move(self, dx, dy)
+
+    def get_separation(self, x, y):
+        # толпа расходится локально: соседи отталкивают сильнее, чем ближе они стоят
+        push_x = push_y = 0
+        xs, ys = self.store.x, self.store.y
+        for npc in self.game.object_handler.get_nearby_npcs(x, y):
+            if npc is self:
+                continue
+            dx, dy = x - xs.item(npc.index), y - ys.item(npc.index)
+            dist = math.hypot(dx, dy)
+            if 0 < dist < NPC_SEPARATION_DIST:
+                push = (NPC_SEPARATION_DIST - dist) / (NPC_SEPARATION_DIST * dist)
+                push_x += dx * push
+                push_y += dy * push
+        return push_x, push_y
 
     def attack(self):
         if self.animation_trigger:
-            if random() < self.accuracy:
+            if self.game.random.random() < self.accuracy:
                 self.game.player.get_damage(self.attack_damage)
 
     def animate_death(self):
@@ -72,13 +118,10 @@ class NPC(AnimatedSprite):
         if self.animation_trigger:
             self.pain = False
 
-    def check_hit_in_npc(self):
-        if self.ray_cast_value and self.game.player.shot:
-            if HALF_WIDTH - self.sprite_half_width < self.screen_x < HALF_WIDTH + self.sprite_half_width:
-                self.game.player.shot = False
-                self.pain = True
-                self.health -= self.game.weapon.damage
-                self.check_health()
+    def hit(self, damage):
+        self.pain = True
+        self.health -= damage
+        self.check_health()
 
     def check_health(self):
         if self.health < 1:
@@ -87,7 +130,6 @@ class NPC(AnimatedSprite):
     def run_logic(self):
         if self.alive:
             self.ray_cast_value = self.ray_cast_player_npc()
-            self.check_hit_in_npc()
 
             if self.pain:
                 self.animate_pain()
@@ -95,7 +137,7 @@ class NPC(AnimatedSprite):
             elif self.ray_cast_value:
                 self.player_search_trigger = True
 
-                if self.dist < self.attack_dist:
+                if self.store.dist.item(self.index) < self.attack_dist:
                     self.animate(self.attack_images)
                     self.attack()
                 else:
@@ -113,22 +155,24 @@ class NPC(AnimatedSprite):
 
     @property
     def map_pos(self):
-        return int(self.x), int(self.y)
+        store, index = self.store, self.index
+        return int(store.x.item(index)), int(store.y.item(index))
 
     def ray_cast_player_npc(self):
-        if self.game.player.map_pos == self.map_pos:
+        player, world_map, map_pos = self.game.player, self.game.map.world_map, self.map_pos
+        if player.map_pos == map_pos:
             return True
 
         wall_dist_v, wall_dist_h = 0, 0
         player_dist_v, player_dist_h = 0, 0
 
-        ox, oy = self.game.player.pos
-        x_map, y_map = self.game.player.map_pos
+        ox, oy = player.pos
+        x_map, y_map = int(ox), int(oy)
 
-        ray_angle = self.theta
+        ray_angle = self.store.theta.item(self.index)
 
-        sin_a = math.sin(ray_angle)
-        cos_a = math.cos(ray_angle)
+        sin_a = math.sin(ray_angle) or 1e-6
+        cos_a = math.cos(ray_angle) or 1e-6
 
         # горизонтально
         y_hor, dy = (y_map + 1, 1) if sin_a > 0 else (y_map - 1e-6, -1)
@@ -141,10 +185,10 @@ class NPC(AnimatedSprite):
 
         for i in range(MAX_DEPTH):
             tile_hor = int(x_hor), int(y_hor)
-            if tile_hor == self.map_pos:
+            if tile_hor == map_pos:
                 player_dist_h = depth_hor
                 break
-            if tile_hor in self.game.map.world_map:
+            if tile_hor in world_map:
                 wall_dist_h = depth_hor
                 break
             x_hor += dx
@@ -162,10 +206,10 @@ class NPC(AnimatedSprite):
 
         for i in range(MAX_DEPTH):
             tile_vert = int(x_vert), int(y_vert)
-            if tile_vert == self.map_pos:
+            if tile_vert == map_pos:
                 player_dist_v = depth_vert
                 break
-            if tile_vert in self.game.map.world_map:
+            if tile_vert in world_map:
                 wall_dist_v = depth_vert
                 break
             x_vert += dx
@@ -187,11 +231,15 @@ class NPC(AnimatedSprite):
 
 
 class SoldierNPC(NPC):
+    __slots__ = ()
+
     def __init__(self, game, path='resources/sprites/npc/soldier/0.png', pos=(10.5, 5.5),
                  scale=0.6, shift=0.38, animation_time=180):
         super().__init__(game, path, pos, scale, shift, animation_time)
 
 class CacoDemonNPC(NPC):
+    __slots__ = ()
+
     def __init__(self, game, path='resources/sprites/npc/caco_demon/0.png', pos=(10.5, 6.5),
                  scale=0.7, shift=0.27, animation_time=250):
         super().__init__(game, path, pos, scale, shift, animation_time)
@@ -202,6 +250,8 @@ class CacoDemonNPC(NPC):
         self.accuracy = 0.35
 
 class CyberDemonNPC(NPC):
+    __slots__ = ()
+
     def __init__(self, game, path='resources/sprites/npc/cyber_demon/0.png', pos=(11.5, 6.0),
                  scale=1.0, shift=0.04, animation_time=210):
         super().__init__(game, path, pos, scale, shift, animation_time)
@@ -1,8 +1,11 @@
 import pygame as pg
+import math
 from settings import *
 from sprite_object import *
 from npc import *
-from random import choices, randrange
+from level import *
+from raycasting import cast_rays
+from functools import cached_property
 
 
 class ObjectRenderer:
@@ -12,7 +15,7 @@ class ObjectRenderer:
         self.wall_textures = self.load_wall_textures()
         self.sky_image = self.get_texture('resources/textures/sky.png', (WIDTH, HALF_HEIGHT))
         self.sky_offset = 0
-        self.digit_size = 90
+        self.digit_size = DIGIT_SIZE
         self.digit_images = [self.get_texture(f'resources/textures/digits/{i}.png', [self.digit_size] * 2)
                              for i in range(11)]
         self.digits = dict(zip(map(str, range(11)), self.digit_images))
@@ -21,23 +24,28 @@ class ObjectRenderer:
     def draw(self):
         self.draw_background()
         self.render_game_objects()
-        self.draw_player_health()
+        self.game.shading.apply()
 
     def win(self):
         self.screen.blit(self.win_image, (0, 0))
 
-    def draw_player_health(self):
-        health = str(self.game.player.health)
-        for i, char in enumerate(health):
-            self.screen.blit(self.digits[char], (i * self.digit_size, 0))
-        self.screen.blit(self.digits['10'], ((i + 1) * self.digit_size, 0))
-
-
     def draw_background(self):
-        self.sky_offset = (self.sky_offset + 4.5 * self.game.player.rel) % WIDTH
-        self.screen.blit(self.sky_image, (-self.sky_offset, 0))
-        self.screen.blit(self.sky_image, (-self.sky_offset + WIDTH, 0))
-        pg.draw.rect(self.screen, FLOOR_COLOR, (0, HALF_HEIGHT, WIDTH, HEIGHT))
+        # смещение неба зависит только от угла камеры, поэтому кадр определяется позой;
+        # за полный оборот небо прокручивается целое число раз, шва на 2π нет
+        self.sky_offset = self.game.camera.angle / math.tau * SKY_REPEAT * WIDTH % WIDTH
+        self.screen.blit(self.background, (0, 0), (self.sky_offset, 0, WIDTH, HEIGHT))
+
+    @cached_property
+    def background(self):
+        # строится при первой отрисовке: мирам без окна он не нужен
+        return self.get_background()
+
+    def get_background(self):
+        # небо двойной ширины над полом: прокрутка - это смещение окна, а фон копируется одним blit
+        background = pg.Surface((2 * WIDTH, HEIGHT)).convert()
+        background.blits([(self.sky_image, (0, 0)), (self.sky_image, (WIDTH, 0))], doreturn=False)
+        background.fill(FLOOR_COLOR, (0, HALF_HEIGHT, 2 * WIDTH, HEIGHT - HALF_HEIGHT))
+        return background
 
     def render_game_objects(self):
         list_objects = sorted(self.game.raycasting.objects_to_render, key=lambda t: t[0], reverse=True)
@@ -46,17 +54,13 @@ class ObjectRenderer:
 
     @staticmethod
     def get_texture(path, res=(TEXTURE_SIZE, TEXTURE_SIZE)):
-        texture = pg.image.load(path).convert_alpha()
-        return pg.transform.scale(texture, res)
+        return assets.texture(path, tuple(res))
 
     def load_wall_textures(self):
-        return {
-            1: self.get_texture('resources/textures/1.png'),
-            2: self.get_texture('resources/textures/2.png'),
-            3: self.get_texture('resources/textures/3.png'),
-            4: self.get_texture('resources/textures/4.png'),
-            5: self.get_texture('resources/textures/5.png'),
-        }
+        self.wall_atlases = get_wall_atlases()
+        self.wall_atlas = self.wall_atlases[0]
+        self.wall_mips = [{texture: atlas.get(texture) for texture in atlas.rects} for atlas in self.wall_atlases]
+        return self.wall_mips[0]
 
 
 class ObjectHandler:
@@ -65,66 +69,115 @@ class ObjectHandler:
         self.sprite_list = []
         self.npc_list = []
         self.npc_sprite_path = 'resources/sprites/npc/'
-        self.static_sprite_path = 'resources/sprites/static_sprites/'
-        self.anim_sprite_path = 'resources/sprites/animated_sprites/'
-        add_sprite = self.add_sprite
-        add_npc = self.add_npc
-        self.npc_positions = {}
+        self.sprite_path = 'resources/sprites/'
+        self.npc_grid = {}
+        self.moves = []
+        self.frame_counter = 0
 
         self.enemies = 20
         self.npc_types = [SoldierNPC, CacoDemonNPC, CyberDemonNPC]
-        self.weights = [70, 20, 10]
+        self.weights = list(NPC_WEIGHTS)
         self.restricted_area = {(i, j) for i in range(10) for j in range(10)}
-        self.spawn_npc()
-
-        # Карта спрайтов 
-        add_sprite(AnimatedSprite(game))
-        add_sprite(AnimatedSprite(game, pos=(1.5, 1.5)))
-        add_sprite(AnimatedSprite(game, pos=(1.5, 7.5)))
-        add_sprite(AnimatedSprite(game, pos=(5.5, 3.25)))
-        add_sprite(AnimatedSprite(game, pos=(5.5, 4.75)))
-        add_sprite(AnimatedSprite(game, pos=(7.5, 2.5)))
-        add_sprite(AnimatedSprite(game, pos=(7.5, 5.5)))
-        add_sprite(AnimatedSprite(game, pos=(14.5, 1.5)))
-        add_sprite(AnimatedSprite(game, pos=(14.5, 4.5)))
-        add_sprite(AnimatedSprite(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(14.5, 5.5)))
-        add_sprite(AnimatedSprite(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(14.5, 7.5)))
-        add_sprite(AnimatedSprite(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(12.5, 7.5)))
-        add_sprite(AnimatedSprite(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(9.5, 7.5)))
-        add_sprite(AnimatedSprite(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(14.5, 12.5)))
-        add_sprite(AnimatedSprite(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(9.5, 20.5)))
-        add_sprite(AnimatedSprite(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(10.5, 20.5)))
-        add_sprite(AnimatedSprite(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(3.5, 14.5)))
-        add_sprite(AnimatedSprite(game, path=self.anim_sprite_path + 'red_light/0.png', pos=(3.5, 18.5)))
-        add_sprite(AnimatedSprite(game, pos=(14.5, 24.5)))
-        add_sprite(AnimatedSprite(game, pos=(14.5, 30.5)))
-        add_sprite(AnimatedSprite(game, pos=(1.5, 30.5)))
-        add_sprite(AnimatedSprite(game, pos=(1.5, 24.5)))
+        self.load_level(game.map.level)
+
+    def load_level(self, level):
+        for kind, x, y in level.sprites.tolist():
+            path = self.sprite_path + SPRITE_KINDS[kind]
+            sprite_type = AnimatedSprite if path.startswith(self.sprite_path + 'animated_sprites') else SpriteObject
+            self.add_sprite(sprite_type(self.game, path=path, pos=(x, y)))
+        for kind, x, y in level.npcs.tolist():
+            self.add_npc(self.npc_types[kind](self.game, pos=(x, y)))
+        if not len(level.npcs):
+            self.spawn_npc()
 
     def spawn_npc(self):
+        rng = self.game.random
         for i in range(self.enemies):
-            npc = choices(self.npc_types, self.weights)[0]
-            pos = x, y = randrange(self.game.map.cols), randrange(self.game.map.rows)
+            npc = rng.choices(self.npc_types, self.weights)[0]
+            pos = x, y = rng.randrange(self.game.map.cols), rng.randrange(self.game.map.rows)
             while (pos in self.game.map.world_map) or (pos in self.restricted_area):
-                pos = x, y = randrange(self.game.map.cols), randrange(self.game.map.rows)
+                pos = x, y = rng.randrange(self.game.map.cols), rng.randrange(self.game.map.rows)
             self.add_npc(npc(self.game, pos=(x + 0.5, y + 0.5)))
 
     def check_win(self):
-        if not len(self.npc_positions):
-            self.game.object_renderer.win()
-            pg.display.flip()
-            pg.time.delay(1500)
-            self.game.new_game()
+        if not self.game.done and not any(npc.alive for npc in self.npc_list):
+            self.game.outcome = 'win'
 
     def update(self):
-        self.npc_positions = {npc.map_pos for npc in self.npc_list if npc.alive}
-        [sprite.update() for sprite in self.sprite_list]
-        [npc.update() for npc in self.npc_list]
+        # обновляются только спрайты и NPC в активных чанках вокруг игрока
+        world = self.game.map.world
+        world.update()
+        active_npcs = world.active_npcs
+        self.game.entities.project(self.game.player, index=world.active_index)
+        self.hitscan(active_npcs)
+        self.npc_grid = {}
+        for npc in active_npcs:
+            if npc.alive:
+                self.npc_grid.setdefault(npc.map_pos, []).append(npc)
+        [sprite.update() for sprite in world.active_sprites]
+        [npc.update() for npc in active_npcs]
+        self.resolve_moves()
+        [world.move_npc(npc) for npc in active_npcs]
+        self.stream_animations(active_npcs)
         self.check_win()
 
+    def queue_move(self, npc, dx, dy):
+        self.moves.append((npc, dx, dy))
+
+    def resolve_moves(self):
+        # шаги всех NPC за тик проходят сквозь сетку одним пакетом
+        if not self.moves:
+            return
+        npcs, dx, dy = zip(*self.moves)
+        self.moves = []
+        store = self.game.entities
+        index = np.array([npc.index for npc in npcs])
+        radius = np.array([npc.size for npc in npcs])
+        store.x[index], store.y[index] = move_circles(self.game.map.grid, store.x[index], store.y[index],
+                                                      np.array(dx), np.array(dy), radius)
+
+    def hitscan(self, npcs):
+        # выстрел проверяется один раз: ближайший живой NPC в центральном столбце ближе стены;
+        # стена - центральный луч из позы игрока на этом тике, буфер глубины кадра не используется
+        player = self.game.player
+        if not player.shot:
+            return None
+        wall_depth = float(cast_rays(self.game.map.grid, player.x, player.y, player.angle)[0])
+        visible = self.game.entities.visible
+        target = None
+        for npc in npcs:
+            if not npc.alive or not visible[npc.index] or npc.norm_dist >= wall_depth:
+                continue
+            half_width = SCREEN_DIST / npc.norm_dist * npc.SPRITE_SCALE * npc.IMAGE_RATIO / 2
+            if abs(npc.screen_x - HALF_WIDTH) < half_width and (target is None or npc.norm_dist < target.norm_dist):
+                target = npc
+        if target is not None:
+            player.shot = False
+            target.hit(self.game.weapon.damage)
+        return target
+
+    def render(self, snapshot):
+        # проекция по интерполированным позициям из среза кадра, только для активных чанков
+        snapshot.entities.project(self.game.camera, snapshot.alpha)
+        [sprite.render(snapshot.entities, image, row) for row, (sprite, image) in enumerate(snapshot.sprites)]
+
+    def get_nearby_npcs(self, x, y):
+        x, y = int(x), int(y)
+        return [npc for dx in (-1, 0, 1) for dy in (-1, 0, 1) for npc in self.npc_grid.get((x + dx, y + dy), ())]
+
+    def stream_animations(self, active_npcs):
+        self.frame_counter += 1
+        if self.frame_counter % ANIMATION_STREAM_INTERVAL:
+            return
+        keep = [path for npc in active_npcs for path in npc.stream_animations()]
+        keep += [path for npc in self.npc_list for path in npc.animations.loaded_paths]
+        animations.evict(keep)
+
     def add_npc(self, npc):
         self.npc_list.append(npc)
+        self.game.map.world.add_npc(npc)
 
     def add_sprite(self, sprite):
         self.sprite_list.append(sprite)
+        self.game.map.world.add_sprite(sprite)
 
@@ -1,27 +1,238 @@
+import numpy as np
+import heapq
 from collections import deque
-from functools import lru_cache
+from collections.abc import Mapping
+from settings import *
+
+
+class GridGraph(Mapping):
+    # представление маски соседей в виде словаря {(x, y): [соседи]}
+    def __init__(self, pathfinding):
+        self.pathfinding = pathfinding
+
+    def __getitem__(self, node):
+        node_id = self.pathfinding.node_id(node)
+        if node_id is None or not self.pathfinding.free[node_id]:
+            raise KeyError(node)
+        return [self.pathfinding.node_pos(node_id + step) for step in self.pathfinding.get_steps(node_id)]
+
+    def __iter__(self):
+        return (self.pathfinding.node_pos(node_id) for node_id in np.flatnonzero(self.pathfinding.free_grid))
+
+    def __len__(self):
+        return int(np.count_nonzero(self.pathfinding.free_grid))
+
+
+class ClusterGraph:
+    # абстрактный граф HPA*: входы между кластерами и расстояния между входами внутри кластера
+    def __init__(self, pathfinding, size=PATH_CLUSTER_SIZE):
+        self.pathfinding = pathfinding
+        self.size = size
+        self.edges = {}
+
+    def get_key(self, node_id):
+        x, y = self.pathfinding.node_pos(node_id)
+        return x // self.size, y // self.size
+
+    def get_bounds(self, key):
+        x0, y0 = key[0] * self.size, key[1] * self.size
+        return x0, y0, min(x0 + self.size, self.pathfinding.cols), min(y0 + self.size, self.pathfinding.rows)
+
+    def get_entrances(self, key):
+        # пары (клетка кластера, клетка соседа) на каждом отрезке свободной границы
+        x0, y0, x1, y1 = self.get_bounds(key)
+        free, node_id = self.pathfinding.free_grid, self.pathfinding.node_id
+        borders = []
+        if x0 > 0:
+            borders.append([((x0, y), (x0 - 1, y)) for y in range(y0, y1)])
+        if x1 < self.pathfinding.cols:
+            borders.append([((x1 - 1, y), (x1, y)) for y in range(y0, y1)])
+        if y0 > 0:
+            borders.append([((x, y0), (x, y0 - 1)) for x in range(x0, x1)])
+        if y1 < self.pathfinding.rows:
+            borders.append([((x, y1 - 1), (x, y1)) for x in range(x0, x1)])
+
+        entrances = []
+        for border in borders:
+            run = []
+            for inner, outer in border + [(None, None)]:
+                if inner is not None and free[inner[1], inner[0]] and free[outer[1], outer[0]]:
+                    run.append((node_id(inner), node_id(outer)))
+                elif run:
+                    entrances += [run[len(run) // 2]] if len(run) < PATH_ENTRANCE_SPLIT else [run[0], run[-1]]
+                    run = []
+        return entrances
+
+    def get_edges(self, key):
+        edges = self.edges.get(key)
+        if edges is None:
+            entrances = self.get_entrances(key)
+            edges = {inner: [] for inner, outer in entrances}
+            for inner, outer in entrances:
+                edges[inner].append((outer, 1))
+            for inner in edges:
+                edges[inner] += [(node, cost) for node, cost in self.get_distances(inner, key, edges).items()
+                                 if node != inner]
+            self.edges[key] = edges
+        return edges
+
+    def get_distances(self, start, key, targets):
+        # BFS в пределах кластера до заданных клеток
+        x0, y0, x1, y1 = self.get_bounds(key)
+        cols, neighbors, mask_steps = self.pathfinding.cols, self.pathfinding.neighbors, self.pathfinding.mask_steps
+        dist = {start: 0}
+        queue = deque([start])
+        found = {}
+
+        while queue:
+            cur_node = queue.popleft()
+            if cur_node in targets:
+                found[cur_node] = dist[cur_node]
+            for step in mask_steps[neighbors[cur_node]]:
+                next_node = cur_node + step
+                if next_node not in dist and x0 <= next_node % cols < x1 and y0 <= next_node // cols < y1:
+                    dist[next_node] = dist[cur_node] + 1
+                    queue.append(next_node)
+        return found
+
+    def search(self, start, goal):
+        # A* по входам кластеров; возвращает точки маршрута без стартовой клетки
+        start_key, goal_key = self.get_key(start), self.get_key(goal)
+        start_edges = self.get_distances(start, start_key, self.get_edges(start_key))
+        goal_edges = self.get_distances(goal, goal_key, self.get_edges(goal_key))
+        node_pos = self.pathfinding.node_pos
+        gx, gy = node_pos(goal)
+
+        def heuristic(node):
+            x, y = node_pos(node)
+            return max(abs(x - gx), abs(y - gy))
+
+        costs = {start: 0}
+        parents = {start: None}
+        queue = [(0, start)]
+        while queue:
+            _, cur_node = heapq.heappop(queue)
+            if cur_node == goal:
+                break
+            if cur_node == start:
+                edges = [*start_edges.items(), *self.get_edges(start_key).get(start, ())]
+            else:
+                edges = self.get_edges(self.get_key(cur_node))[cur_node]
+                if cur_node in goal_edges:
+                    edges = [*edges, (goal, goal_edges[cur_node])]
+            for next_node, cost in edges:
+                cost += costs[cur_node]
+                if cost < costs.get(next_node, cost + 1):
+                    costs[next_node] = cost
+                    parents[next_node] = cur_node
+                    heapq.heappush(queue, (cost + heuristic(next_node), next_node))
+        else:
+            return None
+
+        route = [goal]
+        while parents[route[-1]] != start:
+            route.append(parents[route[-1]])
+        return route[::-1]
+
+    def update_cell(self, x, y):
+        # клетка влияет на свой кластер и на входы соседних кластеров через границу
+        for dx, dy in ((0, 0), *self.pathfinding.ways):
+            node_id = self.pathfinding.node_id((x + dx, y + dy))
+            if node_id is not None:
+                self.edges.pop(self.get_key(node_id), None)
+
+    def evict(self, x0, y0, x1, y1):
+        # рёбра кластеров, задевающих прямоугольник, освобождаются и строятся заново при следующем поиске
+        for key in [key for key in self.edges if key[0] * self.size < x1 and x0 < (key[0] + 1) * self.size
+                    and key[1] * self.size < y1 and y0 < (key[1] + 1) * self.size]:
+            del self.edges[key]
 
 
 class PathFinding:
-    def __init__(self, game):
+    def __init__(self, game, limit=PATH_TICK_REQUESTS):
         self.game = game
-        self.map = game.map.mini_map
+        self.limit = limit
+        self.map = np.asarray(game.map.grid)
         self.ways = [-1, 0], [0, -1], [1, 0], [0, 1], [-1, -1], [1, -1], [1, 1], [-1, 1]
-        self.graph = {}
+        self.rows, self.cols = self.map.shape
+        self.offsets = [dy * self.cols + dx for dx, dy in self.ways]
+        # для каждой из 256 масок заранее известны сдвиги id соседей
+        self.mask_steps = [tuple(offset for bit, offset in enumerate(self.offsets) if mask >> bit & 1)
+                           for mask in range(256)]
+        self.free_grid = np.zeros(self.map.shape, dtype=bool)
+        self.neighbor_grid = np.zeros(self.map.shape, dtype=np.uint8)
+        self.free = memoryview(self.free_grid).cast('B')
+        self.neighbors = memoryview(self.neighbor_grid).cast('B')
+        self.graph = GridGraph(self)
+        self.clusters = ClusterGraph(self)
+        self.paths = {}
+        self.requests = {}
         self.get_graph()
 
-    @lru_cache
+    def node_id(self, node):
+        x, y = node
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return y * self.cols + x
+
+    def node_pos(self, node_id):
+        return node_id % self.cols, node_id // self.cols
+
+    def get_steps(self, node_id):
+        return self.mask_steps[self.neighbors[node_id]]
+
     def get_path(self, start, goal):
-        self.visited = self.bfs(start, goal, self.graph)
-        path = [goal]
-        step = self.visited.get(goal, start)
+        path = self.paths.get((start, goal))
+        if path is None:
+            path = self.paths[start, goal] = self.find_path(start, goal)
+            if len(self.paths) > PATH_CACHE_SIZE:
+                del self.paths[next(iter(self.paths))]
+        return path[0]
 
-        while step and step != start:
+    def request_path(self, start, goal):
+        # без готового пути запрос ставится в очередь, а NPC идёт к прежнему шагу
+        path = self.paths.get((start, goal))
+        if path is None:
+            self.requests[start, goal] = None
+            return None
+        return path[0]
+
+    def update(self):
+        # за тик обслуживается не больше limit запросов, устаревшие цели отбрасываются даром;
+        # лимит в запросах, а не в миллисекундах, поэтому ход NPC не зависит от скорости машины
+        # и запись воспроизводится так же, как игралась
+        searches = self.limit
+        goal = self.game.player.map_pos
+        while self.requests and searches:
+            start, request_goal = next(iter(self.requests))
+            del self.requests[start, request_goal]
+            if request_goal == goal:
+                self.get_path(start, goal)
+                searches -= 1
+
+    def find_path(self, start, goal):
+        # в кэш кладётся следующий шаг, клетки пути и его длина (None, если цель недостижима);
+        # дальний маршрут строится по кластерам и уточняется только до ближайшего входа
+        if max(abs(goal[0] - start[0]), abs(goal[1] - start[1])) <= self.clusters.size:
+            return self.find_local_path(start, goal)
+        route = self.clusters.search(self.node_id(start), self.node_id(goal))
+        if route is None:
+            return goal, None, None
+        return self.find_local_path(start, self.node_pos(route[0]))[0], None, None
+
+    def find_local_path(self, start, goal):
+        start_id, goal_id = self.node_id(start), self.node_id(goal)
+        self.visited = self.bfs(start_id, goal_id)
+        path = [goal_id]
+        step = self.visited.get(goal_id, start_id)
+
+        while step is not None and step != start_id:
             path.append(step)
             step = self.visited[step]
-        return path[-1]
+        length = len(path) if goal_id in self.visited else None
+        return self.node_pos(path[-1]), frozenset(path + [start_id]), length
 
-    def bfs(self, start, goal, graph):
+    def bfs(self, start, goal):
+        neighbors, mask_steps = self.neighbors, self.mask_steps
         queue = deque([start])
         visited = {start: None}
 
@@ -29,19 +240,50 @@ class PathFinding:
             cur_node = queue.popleft()
             if cur_node == goal:
                 break
-            next_nodes = graph[cur_node]
-
-            for next_node in next_nodes:
-                if next_node not in visited and next_node not in self.game.object_handler.npc_positions:
+            for step in mask_steps[neighbors[cur_node]]:
+                next_node = cur_node + step
+                if next_node not in visited:
                     queue.append(next_node)
                     visited[next_node] = cur_node
         return visited
 
-    def get_next_nodes(self, x, y):
-        return [(x + dx, y + dy) for dx, dy in self.ways if (x + dx, y + dy) not in self.game.map.world_map]
-
     def get_graph(self):
-        for y, row in enumerate(self.map):
-            for x, col in enumerate(row):
-                if not col:
-                    self.graph[(x, y)] = self.graph.get((x, y), []) + self.get_next_nodes(x, y)
\ No newline at end of file
+        self.free_grid[:] = self.map == 0
+        self.paths.clear()
+        self.clusters.edges.clear()
+        self.update_masks(0, 0, self.cols, self.rows)
+
+    def update_masks(self, x0, y0, x1, y1):
+        # маска соседей: бит i установлен, если клетка в направлении ways[i] свободна
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, self.cols), min(y1, self.rows)
+        free = self.free_grid[y0:y1, x0:x1]
+        window = np.pad(self.free_grid[max(y0 - 1, 0):y1 + 1, max(x0 - 1, 0):x1 + 1],
+                        ((int(y0 == 0), int(y1 == self.rows)), (int(x0 == 0), int(x1 == self.cols))))
+        height, width = free.shape
+        masks = np.zeros(free.shape, dtype=np.uint8)
+        for bit, (dx, dy) in enumerate(self.ways):
+            shifted = window[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+            masks |= (shifted & free).astype(np.uint8) << bit
+        self.neighbor_grid[y0:y1, x0:x1] = masks
+
+    def update_cell(self, x, y):
+        node_id = self.node_id((x, y))
+        is_free = self.map[y, x] == 0
+        if self.free[node_id] == is_free:
+            return
+        self.free_grid[y, x] = is_free
+        self.update_masks(x - 1, y - 1, x + 2, y + 2)
+        self.clusters.update_cell(x, y)
+
+        # закрытая клетка ломает только проходящие через неё пути, открытая - только те,
+        # что через неё могли бы стать короче; маршруты по кластерам всегда строятся заново
+        for key, (next_pos, nodes, length) in list(self.paths.items()):
+            if nodes is None:
+                del self.paths[key]
+            elif is_free:
+                (sx, sy), (gx, gy) = key
+                shortcut = max(abs(x - sx), abs(y - sy)) + max(abs(gx - x), abs(gy - y))
+                if length is None or shortcut < length:
+                    del self.paths[key]
+            elif node_id in nodes:
+                del self.paths[key]
@@ -1,45 +1,71 @@
 from settings import *
 import pygame as pg
 import math
+from collision import move_circle
+
+
+class Camera:
+    # положение игрока, интерполированное между тиками симуляции; из него строится кадр
+    __slots__ = 'x', 'y', 'angle'
+
+    def __init__(self, player):
+        self.x, self.y, self.angle = player.x, player.y, player.angle
+
+    def interpolate(self, prev_state, state, alpha):
+        (x0, y0, angle0), (x1, y1, angle1) = prev_state, state
+        self.x = x0 + (x1 - x0) * alpha
+        self.y = y0 + (y1 - y0) * alpha
+        turn = (angle1 - angle0 + math.pi) % math.tau - math.pi
+        self.angle = (angle0 + turn * alpha) % math.tau
+
+    @property
+    def pos(self):
+        return self.x, self.y
+
+    @property
+    def map_pos(self):
+        return int(self.x), int(self.y)
 
 
 class Player:
-    def __init__(self, game):
+    __slots__ = ('game', 'x', 'y', 'angle', 'shot', 'health', 'rel', 'health_recovery_delay', 'time_prev',
+                 'diag_move_corr', 'prev_state')
+
+    def __init__(self, game, pos=PLAYER_POS):
         self.game = game
-        self.x, self.y = PLAYER_POS
+        self.x, self.y = pos
         self.angle = PLAYER_ANGLE
         self.shot = False
         self.health = PLAYER_MAX_HEALTH
         self.rel = 0
         self.health_recovery_delay = 700
-        self.time_prev = pg.time.get_ticks()
+        self.time_prev = game.time
         self.diag_move_corr = 1 / math.sqrt(2)
+        self.prev_state = self.x, self.y, self.angle
 
     def recover_health(self):
         if self.check_health_recovery_delay() and self.health < PLAYER_MAX_HEALTH:
             self.health += 1
 
     def check_health_recovery_delay(self):
-        time_now = pg.time.get_ticks()
+        time_now = self.game.time
         if time_now - self.time_prev > self.health_recovery_delay:
             self.time_prev = time_now
             return True
 
     def check_game_over(self):
+        # конец эпизода только отмечается, показ и перезапуск - в Game.sync
         if self.health < 1:
-            pg.display.flip()
-            pg.time.delay(1500)
-            self.game.new_game()
+            self.game.outcome = 'lose'
 
     def get_damage(self, damage):
         self.health -= damage
         self.check_game_over()
 
-    def single_fire_event(self, event):
-        if event.type == pg.MOUSEBUTTONDOWN:
-            if event.button == 1 and not self.shot and not self.game.weapon.reloading:
-                self.shot = True
-                self.game.weapon.reloading = True
+    def fire(self):
+        if not self.shot and not self.game.weapon.reloading:
+            self.shot = True
+            self.game.weapon.reloading = True
 
     def movement(self):
         sin_a = math.sin(self.angle)
@@ -49,7 +75,7 @@ class Player:
         speed_sin = speed * sin_a
         speed_cos = speed * cos_a
 
-        keys = pg.key.get_pressed()
+        keys = self.game.controls.frame.keys
         num_key_pressed = -1
         if keys[pg.K_w]:
             num_key_pressed += 1
@@ -76,15 +102,8 @@ class Player:
 
         self.angle %= math.tau
 
-    def check_wall(self, x, y):
-        return (x, y) not in self.game.map.world_map
-
     def check_wall_collision(self, dx, dy):
-        scale = PLAYER_SIZE_SCALE / self.game.delta_time
-        if self.check_wall(int(self.x + dx * scale), int(self.y)):
-            self.x += dx
-        if self.check_wall(int(self.x), int(self.y + dy * scale)):
-            self.y += dy
+        self.x, self.y = move_circle(self.game.map.grid, self.x, self.y, dx, dy, PLAYER_SIZE)
 
     def draw(self):
         pg.draw.line(self.game.screen, 'yellow', (self.x * 100, self.y * 100),
@@ -93,13 +112,16 @@ class Player:
         pg.draw.circle(self.game.screen, 'green', (self.x * 100, self.y * 100), 15)
 
     def mouse_control(self):
-        mx, my = pg.mouse.get_pos()
-        if mx < MOUSE_BORDER_LEFT or mx > MOUSE_BORDER_RIGHT:
-            pg.mouse.set_pos([HALF_WIDTH, HALF_HEIGHT])
-        self.rel = pg.mouse.get_rel()[0]
-        self.rel = max(-MOUSE_MAX_REL, min(MOUSE_MAX_REL, self.rel))
+        # ввод мыши уже ограничен и записан в Controls.poll
+        frame = self.game.controls.frame
+        if frame.fire:
+            self.fire()
+        self.rel = frame.rel
         self.angle += self.rel * MOUSE_SENSITIVITY * self.game.delta_time
 
+    def save_state(self):
+        self.prev_state = self.x, self.y, self.angle
+
     def update(self):
         self.movement()
         self.mouse_control()
@@ -1,14 +1,76 @@
 import pygame as pg
+import numpy as np
 import math
 from settings import *
 
 
+def march(grid, x, y, dx, dy, depth, delta_depth):
+    # шаги лучей по линиям сетки одной оси; луч, упёршийся в стену, дальше не учитывается
+    rows, cols = grid.shape
+    hit_depth, hit_x, hit_y = depth.copy(), x.copy(), y.copy()
+    hit_texture = np.ones(depth.shape, dtype=grid.dtype)
+    active = np.ones(depth.shape, dtype=bool)
+    for i in range(MAX_DEPTH):
+        tile_x, tile_y = np.floor(x).astype(np.intp), np.floor(y).astype(np.intp)
+        inside = (0 <= tile_x) & (tile_x < cols) & (0 <= tile_y) & (tile_y < rows)
+        texture = grid[np.clip(tile_y, 0, rows - 1), np.clip(tile_x, 0, cols - 1)]
+        hit = active & inside & (texture > 0)
+        hit_depth[hit], hit_x[hit], hit_y[hit], hit_texture[hit] = depth[hit], x[hit], y[hit], texture[hit]
+        active &= ~hit
+        if not active.any():
+            break
+        x, y, depth = x + dx, y + dy, depth + delta_depth
+    else:
+        hit_depth[active], hit_x[active], hit_y[active] = depth[active], x[active], y[active]
+    return hit_depth, hit_texture, hit_x, hit_y
+
+
+def cast_rays(grid, ox, oy, angles):
+    # тот же DDA, что в RayCasting.ray_cast, но сразу для массива лучей любой формы;
+    # возвращает глубину без коррекции рыбьего глаза, номер текстуры и смещение в ней
+    grid = np.asarray(grid)
+    ox, oy, angles = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in (ox, oy, angles)))
+    shape = angles.shape
+    ox, oy, angles = ox.ravel(), oy.ravel(), angles.ravel()
+    sin_a, cos_a = np.sin(angles), np.cos(angles)
+    sin_a[sin_a == 0] = 1e-6
+    cos_a[cos_a == 0] = 1e-6
+    x_map, y_map = np.floor(ox), np.floor(oy)
+
+    # горизонтальные линии сетки
+    y_hor = np.where(sin_a > 0, y_map + 1, y_map - 1e-6)
+    dy = np.where(sin_a > 0, 1.0, -1.0)
+    depth_hor = (y_hor - oy) / sin_a
+    delta_depth = dy / sin_a
+    depth_hor, texture_hor, x_hor, _ = march(grid, ox + depth_hor * cos_a, y_hor, delta_depth * cos_a, dy,
+                                             depth_hor, delta_depth)
+
+    # вертикальные линии сетки
+    x_vert = np.where(cos_a > 0, x_map + 1, x_map - 1e-6)
+    dx = np.where(cos_a > 0, 1.0, -1.0)
+    depth_vert = (x_vert - ox) / cos_a
+    delta_depth = dx / cos_a
+    depth_vert, texture_vert, _, y_vert = march(grid, x_vert, oy + depth_vert * sin_a, dx, delta_depth * sin_a,
+                                                depth_vert, delta_depth)
+
+    vertical = depth_vert < depth_hor
+    depth = np.where(vertical, depth_vert, depth_hor)
+    texture = np.where(vertical, texture_vert, texture_hor)
+    y_vert, x_hor = y_vert % 1, x_hor % 1
+    offset = np.where(vertical, np.where(cos_a > 0, y_vert, 1 - y_vert), np.where(sin_a > 0, 1 - x_hor, x_hor))
+    return depth.reshape(shape), texture.reshape(shape), offset.reshape(shape)
+
+
 class RayCasting:
     def __init__(self, game):
         self.game = game
         self.ray_casting_result = []
         self.objects_to_render = []
         self.textures = self.game.object_renderer.wall_textures
+        self.mip_textures = self.game.object_renderer.wall_mips
+        self.mip_levels = len(self.mip_textures)
+        self.texture_arrays = {}
+        self.sky_color = None
 
     def get_objects_to_render(self):
         self.objects_to_render = []
@@ -16,8 +78,10 @@ class RayCasting:
             depth, proj_height, texture, offset = values
 
             if proj_height < HEIGHT:
-                wall_column = self.textures[texture].subsurface(
-                    offset * (TEXTURE_SIZE - SCALE), 0, SCALE, TEXTURE_SIZE
+                level = min(max(int(TEXTURE_SIZE / (proj_height + 1)).bit_length() - 1, 0), self.mip_levels - 1)
+                texture_size = TEXTURE_SIZE >> level
+                wall_column = self.mip_textures[level][texture].subsurface(
+                    offset * (texture_size - SCALE), 0, SCALE, texture_size
                 )
                 wall_column = pg.transform.scale(wall_column, (SCALE, proj_height))
                 wall_pos = (ray * SCALE, HALF_HEIGHT - proj_height // 2)
@@ -33,12 +97,14 @@ class RayCasting:
             self.objects_to_render.append((depth, wall_column, wall_pos))
 
     def ray_cast(self):
-        self.ray_casting_result = []
+        # результат собирается в новый список и подменяется целиком: Game.render_frame держит
+        # ссылку на список живого кадра и после рендера возвращает его нетронутым
+        ray_casting_result = []
         texture_vert, texture_hor = 1, 1
-        ox, oy = self.game.player.pos
-        x_map, y_map = self.game.player.map_pos
+        ox, oy = self.game.camera.pos
+        x_map, y_map = self.game.camera.map_pos
 
-        ray_angle = self.game.player.angle - HALF_FOV + 0.0001
+        ray_angle = self.game.camera.angle - HALF_FOV + 0.0001
         for ray in range(NUM_RAYS):
             sin_a = math.sin(ray_angle)
             cos_a = math.cos(ray_angle)
@@ -86,14 +152,59 @@ class RayCasting:
                 x_hor %= 1
                 offset = (1 - x_hor) if sin_a > 0 else x_hor
 
-            depth *= math.cos(self.game.player.angle - ray_angle)
+            depth *= math.cos(self.game.camera.angle - ray_angle)
 
             proj_height = SCREEN_DIST / (depth + 0.0001)
 
-            self.ray_casting_result.append((depth, proj_height, texture, offset))
+            ray_casting_result.append((depth, proj_height, texture, offset))
 
             ray_angle += DELTA_ANGLE
 
+        self.ray_casting_result = ray_casting_result
+
+    def cast_views(self, poses, num_rays=NUM_RAYS, fov=FOV):
+        # N поз камеры (x, y, angle) за один векторный проход по общей сетке карты;
+        # результат - массивы (N, num_rays): глубина с коррекцией, номер текстуры и смещение в ней
+        poses = np.asarray(poses, dtype=float).reshape(-1, 3)
+        x, y, angle = poses[:, :1], poses[:, 1:2], poses[:, 2:]
+        ray_offsets = -fov / 2 + 0.0001 + np.arange(num_rays) * fov / num_rays
+        depth, texture, offset = cast_rays(self.game.map.grid, x, y, angle + ray_offsets)
+        return depth * np.cos(ray_offsets), texture, offset
+
+    def render_views(self, poses, size=VIEW_SIZE, fov=FOV):
+        # кадры (N, высота, ширина, RGB) по столбцу на луч: стены из мипа под высоту кадра,
+        # небо и пол заливаются одним цветом
+        width, height = size
+        depth, texture, offset = self.cast_views(poses, width, fov)
+        textures, texture_size = self.get_texture_array(height)
+        proj_height = width / 2 / math.tan(fov / 2) / (depth + 0.0001)
+        top = (height - proj_height) / 2
+        v = (np.arange(height)[None, :, None] + 0.5 - top[:, None, :]) / proj_height[:, None, :]
+        tex_x = np.minimum((offset * texture_size).astype(np.intp), texture_size - 1)[:, None, :]
+        tex_y = np.clip((v * texture_size).astype(np.intp), 0, texture_size - 1)
+        walls = textures[texture[:, None, :], tex_x, tex_y]
+        wall = ((0 <= v) & (v < 1))[..., None]
+        return np.where(wall, walls, self.get_view_background(height)[None, :, None, :])
+
+    def get_texture_array(self, height):
+        # стопка текстур одного мипа, индексируемая номером текстуры
+        level = min(max(int(TEXTURE_SIZE / height).bit_length() - 1, 0), self.mip_levels - 1)
+        if level not in self.texture_arrays:
+            mips = self.mip_textures[level]
+            size = next(iter(mips.values())).get_width()
+            array = np.zeros((max(mips) + 1, size, size, 3), dtype=np.uint8)
+            for texture, surface in mips.items():
+                array[texture] = pg.surfarray.array3d(surface)
+            self.texture_arrays[level] = array, size
+        return self.texture_arrays[level]
+
+    def get_view_background(self, height):
+        if self.sky_color is None:
+            self.sky_color = pg.transform.average_color(self.game.object_renderer.sky_image)[:3]
+        background = np.empty((height, 3), dtype=np.uint8)
+        background[:height // 2], background[height // 2:] = self.sky_color, FLOOR_COLOR
+        return background
+
     def update(self):
         self.ray_cast()
         self.get_objects_to_render()
\ No newline at end of file
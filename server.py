@@ -0,0 +1,169 @@
+import os
+import argparse
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+from main import *
+
+
+class StepControls(Replay):
+    # ввод мира задаётся снаружи: каждый step передаёт кадр ввода (кнопки, смещение мыши)
+    def __init__(self, seed):
+        super().__init__((), seed)
+        self.action = 0, 0
+
+    def poll(self):
+        return InputFrame.decode(*self.action)
+
+
+class SharedGrid:
+    # сетка уровня в общей памяти: миры всех процессов читают одну копию
+    def __init__(self, grid=None, name=None, shape=None):
+        if grid is not None:
+            self.memory = shared_memory.SharedMemory(create=True, size=grid.nbytes)
+            self.shape = grid.shape
+            np.ndarray(self.shape, np.uint8, self.memory.buf)[:] = grid
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.shape = shape
+        self.array = np.ndarray(self.shape, np.uint8, self.memory.buf)
+        self.array.flags.writeable = False
+
+    def __reduce__(self):
+        return SharedGrid, (None, self.memory.name, self.shape)
+
+    def close(self):
+        del self.array
+        self.memory.close()
+
+
+class World:
+    def __init__(self, level, grid, seed):
+        # сетка - общая и только для чтения, спрайты и NPC у каждого мира свои
+        level = Level(grid.array, level.sprites, level.npcs, level.player_pos, copy=False)
+        self.game = Game(level=level, controls=StepControls(seed))
+        self.game.game_active = True
+        self.ticks = 0
+        self.episodes = 0
+
+    def reset(self):
+        # новый эпизод без показа итога и задержки; сетка остаётся общей
+        self.game.new_game()
+        self.episodes += 1
+
+    def step(self, action=(0, 0)):
+        # эпизод, закончившийся на прошлом шаге, перезапускается перед следующим тиком
+        if self.game.done:
+            self.reset()
+        self.game.controls.action = action
+        self.game.tick(self.game.controls.poll())
+        self.ticks += 1
+
+    def observe(self, view=False):
+        game, player = self.game, self.game.player
+        observation = {'tick': self.ticks, 'episode': self.episodes, 'pose': (player.x, player.y, player.angle),
+                       'health': player.health, 'npcs': sum(npc.alive for npc in game.object_handler.npc_list),
+                       'done': game.done, 'outcome': game.outcome}
+        if view:
+            observation['view'] = game.raycasting.render_views([observation['pose']])[0]
+        return observation
+
+
+def prepare_assets(path=ASSET_CACHE_PATH):
+    # сборка кэша делает convert(), которому нужно окно: без него открывается скрытое окно 1x1
+    if pg.display.get_surface() is None:
+        pg.init()
+        pg.display.set_mode((1, 1), pg.HIDDEN)
+    assets.path = path
+    assets.prepare()
+
+
+def serve(connection, worlds, cache_path):
+    # процесс-исполнитель: держит свои миры и отвечает на команды из канала
+    prepare_assets(cache_path)
+    worlds = {index: World(Level(grid.array, sprites, npcs, player_pos, copy=False), grid, seed)
+              for index, (grid, sprites, npcs, player_pos, seed) in worlds.items()}
+    while (message := connection.recv()) is not None:
+        command, payload = message
+        if command == 'step':
+            actions, view = payload
+            for index, world in worlds.items():
+                world.step(actions.get(index, (0, 0)))
+            connection.send({index: world.observe(view) for index, world in worlds.items()})
+        elif command == 'run':
+            for _ in range(payload):
+                for world in worlds.values():
+                    world.step()
+            connection.send(payload)
+
+
+class WorldServer:
+    # много независимых миров без окна в пуле процессов; одинаковые сетки уровней лежат в общей памяти
+    def __init__(self, levels, seeds, workers=None):
+        prepare_assets(assets.path)
+        workers = min(workers or os.cpu_count(), len(seeds))
+        self.size = len(seeds)
+        self.grids = {}
+        jobs = [{} for _ in range(workers)]
+        for index, (level, seed) in enumerate(zip(levels, seeds)):
+            if id(level) not in self.grids:
+                self.grids[id(level)] = SharedGrid(level.grid)
+            # в задание идут только таблицы спрайтов и NPC, сетка передаётся именем общей памяти
+            jobs[index % workers][index] = self.grids[id(level)], level.sprites, level.npcs, level.player_pos, seed
+
+        context = mp.get_context('spawn')
+        self.connections, self.processes = [], []
+        for job in jobs:
+            parent, child = context.Pipe()
+            process = context.Process(target=serve, args=(child, job, assets.path), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def step(self, actions=None, view=False):
+        # actions: {номер мира: (кнопки, смещение мыши)}; возвращает наблюдения всех миров по номеру
+        for connection in self.connections:
+            connection.send(('step', (actions or {}, view)))
+        observations = {}
+        for connection in self.connections:
+            observations.update(connection.recv())
+        return [observations[index] for index in range(self.size)]
+
+    def run(self, ticks):
+        # нагрузочный прогон без обмена на каждом тике; возвращает суммарную скорость в тиках в секунду
+        start = time.perf_counter()
+        for connection in self.connections:
+            connection.send(('run', ticks))
+        [connection.recv() for connection in self.connections]
+        return ticks * self.size / (time.perf_counter() - start)
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+        for process in self.processes:
+            process.join()
+        for grid in self.grids.values():
+            grid.close()
+            grid.memory.unlink()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Параллельный прогон миров без окна')
+    parser.add_argument('level', nargs='?')
+    parser.add_argument('--worlds', type=int, default=8)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--ticks', type=int, default=600)
+    args = parser.parse_args()
+
+    level = Level.load(args.level) if args.level else Level.from_mini_map(mini_map, mini_map_sprites)
+    server = WorldServer([level] * args.worlds, range(args.worlds), args.workers)
+    try:
+        throughput = server.run(args.ticks)
+    finally:
+        server.close()
+    print(f'{args.worlds} worlds, {len(server.processes)} workers: {throughput:.0f} ticks/s '
+          f'({throughput / args.worlds:.0f} per world)')
@@ -6,12 +6,17 @@ RES = WIDTH, HEIGHT = 1280, 900
 HALF_WIDTH = WIDTH // 2
 HALF_HEIGHT = HEIGHT // 2
 FPS = 0
+TICK_RATE = 60
+TICK_TIME = 1000 / TICK_RATE
+MAX_TICKS_PER_FRAME = 5
+GLOBAL_TRIGGER_TIME = 40  # мс симуляции между кадрами анимации смерти
+PIPELINED = False
 
-PLAYER_POS = 2, 5
+PLAYER_POS = 2.5, 5.5
 PLAYER_ANGLE = 0
 PLAYER_SPEED = 0.004
 PLAYER_ROT_SPEED = 0.002
-PLAYER_SIZE_SCALE = 60
+PLAYER_SIZE = 0.24  # радиус в клетках
 PLAYER_MAX_HEALTH = 100
 
 MOUSE_SENSITIVITY = 0.0003
@@ -20,6 +25,19 @@ MOUSE_BORDER_LEFT = 100
 MOUSE_BORDER_RIGHT = WIDTH - MOUSE_BORDER_LEFT
 
 FLOOR_COLOR = (30, 30, 30)
+SKY_REPEAT = 4  # сколько раз небо прокручивается за полный оборот камеры
+
+EXPORT_QUEUE_SIZE = 8
+EXPORT_PNG_LEVEL = 1
+
+MINIMAP = False
+MINIMAP_SCALE = 6
+MINIMAP_SIZE = 240
+MINIMAP_POS = WIDTH - MINIMAP_SIZE - 20, 20
+MINIMAP_WALL_COLOR = (90, 90, 90)
+MINIMAP_FLOOR_COLOR = (20, 20, 20)
+MINIMAP_RAY_COLOR = (200, 200, 80)
+MINIMAP_RAY_STEP = 16
 
 FOV = math.pi / 3
 HALF_FOV = FOV / 2
@@ -30,6 +48,43 @@ MAX_DEPTH = 20
 
 SCREEN_DIST = HALF_WIDTH / math.tan(HALF_FOV)
 SCALE = WIDTH // NUM_RAYS
+VIEW_SIZE = 160, 90
 
 TEXTURE_SIZE = 516
-HALF_TEXTURE_SIZE = TEXTURE_SIZE // 2
\ No newline at end of file
+HALF_TEXTURE_SIZE = TEXTURE_SIZE // 2
+WALL_TEXTURES = 1, 2, 3, 4, 5
+WALL_MIP_LEVELS = 4
+DIGIT_SIZE = 90
+WEAPON_SCALE = 0.4
+ASSET_CACHE_PATH = 'resources/assets.cache'
+
+CHUNK_SIZE = 16
+ACTIVE_CHUNK_RADIUS = 2
+PAGE_OUT_CHUNK_RADIUS = 3
+PATH_CACHE_SIZE = 128
+PATH_CLUSTER_SIZE = 16
+PATH_ENTRANCE_SPLIT = 6
+PATH_TICK_REQUESTS = 8  # поисков пути за тик
+
+NPC_ANIMATIONS = 'attack', 'death', 'idle', 'pain', 'walk'
+ANIMATION_PRELOAD_DIST = 6
+ANIMATION_EVICT_DIST = 12
+ANIMATION_STREAM_INTERVAL = 30
+NPC_SEPARATION_DIST = 0.6
+NPC_SEPARATION_WEIGHT = 1.5
+
+SPRITE_COLORKEY = (255, 0, 255)
+SPRITE_COLORKEY_SUBSTITUTE = (254, 0, 255)
+ALPHA_THRESHOLD = 128
+
+SHADING = True
+SHADING_ROW_STEP = 2
+FOG_START = 2
+FOG_END = 14
+FOG_MIN = 0.15
+AMBIENT_LIGHT = 0.75
+LIGHT_RADIUS = 2.5
+LIGHT_COLORS = {
+    'green_light': (0.15, 0.6, 0.2),
+    'red_light': (0.6, 0.12, 0.1),
+}
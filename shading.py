@@ -0,0 +1,94 @@
+import pygame as pg
+import numpy as np
+from functools import cached_property
+from settings import *
+
+
+class Shading:
+    def __init__(self, game):
+        self.game = game
+        self.enabled = SHADING
+        self.rows = np.arange(SHADING_ROW_STEP // 2, HEIGHT, SHADING_ROW_STEP, dtype=np.float32)
+        self.ray_offsets = np.arange(NUM_RAYS, dtype=np.float32) * DELTA_ANGLE - HALF_FOV + 0.0001
+        self.ray_cos = np.cos(self.ray_offsets)
+        # глубина пола для каждой строки экрана, небо бесконечно далеко
+        floor_rows = self.rows - HALF_HEIGHT
+        self.row_depth = np.where(floor_rows > 0, SCREEN_DIST / (2 * np.maximum(floor_rows, 0.5)), np.inf)
+        self.light_pos, self.light_color = self.get_lights()
+
+        self.shade_map = pg.Surface((NUM_RAYS, len(self.rows)))
+        self.channel_shifts = self.shade_map.get_shifts()[:3]
+        self.no_shade = self.shade_map.map_rgb((255, 255, 255))
+
+    @cached_property
+    def shade_frame(self):
+        # кадр размером с экран создаётся при первой отрисовке, мирам без окна он не нужен
+        return pg.Surface(RES)
+
+    def get_lights(self):
+        positions, colors = [], []
+        for sprite in self.game.object_handler.sprite_list:
+            color = LIGHT_COLORS.get(getattr(sprite, 'path', '').rsplit('/', 1)[-1])
+            if color is not None:
+                positions.append((sprite.x, sprite.y))
+                colors.append(color)
+        return (np.array(positions, dtype=np.float32).reshape(-1, 2),
+                np.array(colors, dtype=np.float32).reshape(-1, 3))
+
+    def get_depth_buffer(self):
+        walls = np.array(self.game.raycasting.ray_casting_result, dtype=np.float32)
+        depth, proj_height = walls[:, 0], walls[:, 1]
+        top = HALF_HEIGHT - proj_height // 2
+        mask = (self.rows >= top[:, None]) & (self.rows < (top + proj_height)[:, None])
+        depth_buffer = np.where(mask, depth[:, None], self.row_depth)
+
+        # спрайты идут в objects_to_render сразу после столбцов стен; глубина спрайта пишется
+        # только в непрозрачные клетки - маска цветового ключа, уменьшенная до сетки затенения
+        for norm_dist, image, pos in self.game.raycasting.objects_to_render[len(walls):]:
+            x, y = int(pos[0]) // SCALE, int(pos[1]) // SHADING_ROW_STEP
+            width, height = image.get_size()
+            cols, rows = -(-width // SCALE), -(-height // SHADING_ROW_STEP)
+            if x + cols <= 0 or y + rows <= 0:
+                continue
+            region = depth_buffer[max(x, 0):x + cols, max(y, 0):y + rows]
+            if not region.size:
+                continue
+            opaque = pg.surfarray.array_colorkey(pg.transform.scale(image, (cols, rows)))
+            opaque = opaque[max(-x, 0):, max(-y, 0):][:region.shape[0], :region.shape[1]] > 0
+            np.minimum(region, norm_dist, out=region, where=opaque)
+        return depth_buffer, depth
+
+    def get_light_map(self, depth):
+        if not len(self.light_pos):
+            return np.zeros((NUM_RAYS, 3), dtype=np.float32)
+        player = self.game.camera
+        angles = player.angle + self.ray_offsets
+        ray_depth = depth / self.ray_cos
+        hit_x = player.x + ray_depth * np.cos(angles)
+        hit_y = player.y + ray_depth * np.sin(angles)
+        dist2 = (hit_x[:, None] - self.light_pos[:, 0]) ** 2 + (hit_y[:, None] - self.light_pos[:, 1]) ** 2
+        falloff = LIGHT_RADIUS ** 2 / (LIGHT_RADIUS ** 2 + dist2)
+        return falloff @ self.light_color
+
+    def get_shade(self):
+        depth_buffer, depth = self.get_depth_buffer()
+        fog = np.clip((FOG_END - depth_buffer) * (1 / (FOG_END - FOG_START)), FOG_MIN, 1)
+        fog = (fog * 255).astype(np.uint32)
+        light = np.clip(AMBIENT_LIGHT + self.get_light_map(depth), 0, 1)
+        light = (light * 256).astype(np.uint32)
+
+        shade = np.zeros(fog.shape, dtype=np.uint32)
+        for channel, shift in enumerate(self.channel_shifts):
+            value = fog * light[:, channel, None]
+            value >>= 8
+            value <<= shift
+            shade |= value
+        shade[np.isinf(depth_buffer)] = self.no_shade
+        return shade
+
+    def apply(self):
+        if not self.enabled or not self.game.raycasting.ray_casting_result:
+            return
+        pg.surfarray.blit_array(self.shade_map, self.get_shade())
+        pg.transform.scale(self.shade_map, RES, self.shade_frame)
+        self.game.screen.blit(self.shade_frame, (0, 0), special_flags=pg.BLEND_RGB_MULT)
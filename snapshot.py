@@ -0,0 +1,15 @@
+class FrameSnapshot:
+    # неизменяемый срез состояния после тиков: кадр рисуется из него, пока симулируется следующий
+    __slots__ = 'prev_state', 'state', 'alpha', 'entities', 'sprites', 'health', 'weapon'
+
+    def __init__(self, game, alpha):
+        player, world = game.player, game.map.world
+        self.prev_state = player.prev_state
+        self.state = player.x, player.y, player.angle
+        self.alpha = alpha
+        # копируются только строки активных чанков; i-й спрайт лежит в i-й строке копии
+        sprites = world.active_sprites + world.active_npcs
+        self.entities = game.entities.copy([sprite.index for sprite in sprites])
+        self.sprites = [(sprite, sprite.image) for sprite in sprites]
+        self.health = player.health
+        self.weapon = game.weapon.images[0]
@@ -1,66 +1,90 @@
 import pygame as pg
 from settings import *
-import os
+from atlas import *
+from entities import *
 from collections import deque
+from functools import lru_cache
 
 
 class SpriteObject:
+    __slots__ = ('game', 'player', 'image', 'IMAGE_WIDTH', 'IMAGE_HEIGHT', 'IMAGE_RATIO',
+                 'store', 'index', 'sprite_half_width')
+    x, y = entity_field('x'), entity_field('y')
+    dx, dy, theta = entity_field('dx'), entity_field('dy'), entity_field('theta')
+    screen_x, dist, norm_dist = entity_field('screen_x'), entity_field('dist'), entity_field('norm_dist')
+    SPRITE_SCALE, SPRITE_HEIGHT_SHIFT = entity_field('scale'), entity_field('shift')
+    IMAGE_HALF_WIDTH = entity_field('half_width')
+
     def __init__(self, game, path='resources/sprites/static_sprites/candlebra.png',
                  pos=(10.5, 3.5), scale=0.7, shift=0.27):
         self.game = game
         self.player = game.player
-        self.x, self.y = pos
-        self.image = pg.image.load(path).convert_alpha()
-        self.IMAGE_WIDTH = self.image.get_width()
-        self.IMAGE_HALF_WIDTH = self.image.get_width() // 2
-        self.IMAGE_RATIO = self.IMAGE_WIDTH / self.image.get_height()
-        self.dx, self.dy, self.theta, self.screen_x, self.dist, self.norm_dist = 0, 0, 0, 0, 1, 1
+        self.image = self.get_image(path)
+        self.IMAGE_WIDTH, self.IMAGE_HEIGHT = self.image.get_size()
+        self.IMAGE_RATIO = self.IMAGE_WIDTH / self.IMAGE_HEIGHT
+        self.store = game.entities
+        self.index = self.store.add(self, *pos, scale, shift, self.IMAGE_WIDTH // 2)
         self.sprite_half_width = 0
-        self.SPRITE_SCALE = scale
-        self.SPRITE_HEIGHT_SHIFT = shift
 
-    def get_sprite_projection(self):
-        proj = SCREEN_DIST / self.norm_dist * self.SPRITE_SCALE
+    def get_image(self, path):
+        return get_sprite_image(path)
+
+    def get_sprite_projection(self, store=None, image=None, index=None):
+        # store, image и строка index задаются при отрисовке из среза кадра, иначе берутся текущие
+        store = self.store if store is None else store
+        image = self.image if image is None else image
+        index = self.index if index is None else index
+        norm_dist = store.norm_dist[index]
+        proj = SCREEN_DIST / norm_dist * store.scale[index]
         proj_width, proj_height = proj * self.IMAGE_RATIO, proj
 
-        image = pg.transform.scale(self.image, (proj_width, proj_height))
+        image = pg.transform.scale(image, (proj_width, proj_height))
 
         self.sprite_half_width = proj_width // 2
-        height_shift = proj_height * self.SPRITE_HEIGHT_SHIFT
-        pos = self.screen_x - self.sprite_half_width, HALF_HEIGHT - proj_height // 2 + height_shift
+        height_shift = proj_height * store.shift[index]
+        pos = store.screen_x[index] - self.sprite_half_width, HALF_HEIGHT - proj_height // 2 + height_shift
 
-        self.game.raycasting.objects_to_render.append((self.norm_dist, image, pos))
+        self.game.raycasting.objects_to_render.append((norm_dist, image, pos))
 
     def get_sprite(self):
-        dx = self.x - self.player.x
-        dy = self.y - self.player.y
+        player = self.player
+        dx = self.x - player.x
+        dy = self.y - player.y
         self.dx, self.dy = dx, dy
-        self.theta = math.atan2(dy, dx)
+        self.theta = theta = math.atan2(dy, dx)
 
-        delta = self.theta - self.player.angle
-        if (dx > 0 and self.player.angle > math.pi) or (dx < 0 and dy < 0):
+        delta = theta - player.angle
+        if (dx > 0 and player.angle > math.pi) or (dx < 0 and dy < 0):
             delta += math.tau
 
         delta_rays = delta / DELTA_ANGLE
-        self.screen_x = (HALF_NUM_RAYS + delta_rays) * SCALE
+        self.screen_x = screen_x = (HALF_NUM_RAYS + delta_rays) * SCALE
 
-        self.dist = math.hypot(dx, dy)
-        self.norm_dist = self.dist * math.cos(delta)
-        if -self.IMAGE_HALF_WIDTH < self.screen_x < (WIDTH + self.IMAGE_HALF_WIDTH) and self.norm_dist > 0.5:
+        self.dist = dist = math.hypot(dx, dy)
+        self.norm_dist = norm_dist = dist * math.cos(delta)
+        half_width = self.IMAGE_HALF_WIDTH
+        if -half_width < screen_x < (WIDTH + half_width) and norm_dist > 0.5:
             self.get_sprite_projection()
 
+    def render(self, store=None, image=None, index=None):
+        # проекция уже посчитана EntityStore.project для всех сущностей кадра
+        if (self.store if store is None else store).visible[self.index if index is None else index]:
+            self.get_sprite_projection(store, image, index)
+
     def update(self):
-        self.get_sprite()
+        pass
 
 
 class AnimatedSprite(SpriteObject):
+    __slots__ = 'animation_time', 'path', 'images', 'animation_time_prev', 'animation_trigger'
+
     def __init__(self, game, path='resources/sprites/animated_sprites/green_light/0.png',
                  pos=(11.5, 3.5), scale=0.8, shift=0.16, animation_time=120):
         super().__init__(game, path, pos, scale, shift)
         self.animation_time = animation_time
         self.path = path.rsplit('/', 1)[0]
         self.images = self.get_images(self.path)
-        self.animation_time_prev = pg.time.get_ticks()
+        self.animation_time_prev = game.time
         self.animation_trigger = False
 
     def update(self):
@@ -75,15 +99,40 @@ class AnimatedSprite(SpriteObject):
 
     def check_animation_time(self):
         self.animation_trigger = False
-        time_now = pg.time.get_ticks()
+        time_now = self.game.time
         if time_now - self.animation_time_prev > self.animation_time:
             self.animation_time_prev = time_now
             self.animation_trigger = True
 
     def get_images(self, path):
-        images = deque()
-        for file_name in os.listdir(path):
-            if os.path.isfile(os.path.join(path, file_name)):
-                img = pg.image.load(path + '/' + file_name).convert_alpha()
-                images.append(img)
+        return deque(get_sprite_frames(path))
+
+
+@lru_cache
+def get_animation_paths(path, states):
+    return {state: f'{path}/{state}' for state in states}
+
+
+class AnimationSet:
+    __slots__ = 'paths', 'images'
+
+    def __init__(self, path, states):
+        self.paths = get_animation_paths(path, states)
+        self.images = {}
+
+    def __getitem__(self, state):
+        images = self.images.get(state)
+        if images is None:
+            images = self.images[state] = deque(animations.get(self.paths[state]).frames)
         return images
+
+    def preload(self):
+        animations.preload(path for state, path in self.paths.items() if state not in self.images)
+
+    def evict(self, keep=()):
+        for state in self.images.keys() - set(keep):
+            del self.images[state]
+
+    @property
+    def loaded_paths(self):
+        return [self.paths[state] for state in self.images]
@@ -2,17 +2,23 @@ from sprite_object import *
 
 
 class Weapon(AnimatedSprite):
-    def __init__(self, game, path='resources/sprites/weapon/shotgun/0.png', scale=0.4, animation_time=90):
+    __slots__ = 'weapon_scale', 'weapon_pos', 'reloading', 'num_images', 'frame_counter', 'damage'
+
+    def __init__(self, game, path='resources/sprites/weapon/shotgun/0.png', scale=WEAPON_SCALE, animation_time=90):
+        self.weapon_scale = scale
         super().__init__(game=game, path=path, scale=scale, animation_time=animation_time)
-        self.images = deque(
-            [pg.transform.smoothscale(img, (self.image.get_width() * scale, self.image.get_height() * scale))
-             for img in self.images])
         self.weapon_pos = (HALF_WIDTH - self.images[0].get_width() // 2, HEIGHT - self.images[0].get_height())
         self.reloading = False
         self.num_images = len(self.images)
         self.frame_counter = 0
         self.damage = 50
 
+    def get_image(self, path):
+        return self.get_images(path.rsplit('/', 1)[0])[0]
+
+    def get_images(self, path):
+        return deque(get_sprite_atlas(path, self.weapon_scale, rle=True).frames)
+
     def animate_shot(self):
         if self.reloading:
             self.game.player.shot = False